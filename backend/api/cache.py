@@ -0,0 +1,90 @@
+"""Версионированный кэш ответов API.
+
+Записи не удаляются при изменении данных: вместо этого увеличивается
+версия, входящая в ключ, и старые записи просто перестают читаться.
+Пропавшая из кэша версия инициализируется текущим временем, чтобы не
+совпасть со старыми ключами.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+RECIPE_VERSION_KEY = 'recipe-version:{}'
+AUTHOR_VERSION_KEY = 'author-version:{}'
+CATALOG_VERSION_KEY = 'catalog-version'
+
+# Поля, которые не кэшируются, а накладываются при каждом ответе:
+# флаги текущего юзера и часто меняющиеся счётчики.
+RECIPE_USER_FIELDS = ('is_favorited', 'is_in_shopping_cart',
+                      'favorites_count', 'carts_count')
+AUTHOR_USER_FIELDS = ('is_subscribed', 'recipes_count', 'followers_count')
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Увеличивает версию и возвращает новое значение."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def recipe_detail_key(recipe_id, host):
+    return (f'recipe-detail:{host}:{recipe_id}:'
+            f'{get_version(RECIPE_VERSION_KEY.format(recipe_id))}:'
+            f'{get_version(CATALOG_VERSION_KEY)}')
+
+
+def author_version(author_id):
+    return get_version(AUTHOR_VERSION_KEY.format(author_id))
+
+
+def get_recipe_detail(key):
+    """Общая для всех юзеров часть рецепта или None.
+
+    Запись считается устаревшей, если с момента её сохранения
+    изменился профиль автора.
+    """
+    entry = cache.get(key)
+    if entry is None or entry['author_version'] != author_version(
+        entry['author_id']
+    ):
+        return None
+    return entry['data']
+
+
+def set_recipe_detail(key, data, version):
+    """Сохраняет рецепт без значений полей текущего юзера и счётчиков.
+
+    Ключ и версия автора читаются до чтения рецепта из БД: иначе
+    изменение между чтениями сохранит старые данные под новой версией.
+    Ключи полей остаются (со значением None), чтобы наложение флагов
+    сохраняло порядок полей ответа.
+    """
+    data = {
+        key: None if key in RECIPE_USER_FIELDS else value
+        for key, value in data.items()
+    }
+    data['author'] = {
+        key: None if key in AUTHOR_USER_FIELDS else value
+        for key, value in data['author'].items()
+    }
+    cache.set(
+        key,
+        {
+            'data': data,
+            'author_id': data['author']['id'],
+            'author_version': version,
+        },
+        settings.RECIPE_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,88 @@
+import csv
+import json
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def format_amount(value):
+    """Количество после перевода единиц: без лишних знаков после запятой."""
+    value = round(value, 2)
+    return int(value) if value == int(value) else value
+
+
+class TextExporter:
+    """Список покупок построчно в текстовом виде."""
+
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def header(self):
+        return ()
+
+    def footer(self):
+        return ()
+
+    def row(self, index, item):
+        line = (f'- {item["name"]} ({item["measurement_unit"]}) - '
+                f'{format_amount(item["total"])}')
+        return line if index == 0 else f'\n{line}'
+
+    def stream(self, items):
+        yield from self.header()
+        for index, item in enumerate(items):
+            yield self.row(index, item)
+        yield from self.footer()
+
+
+class CsvExporter(TextExporter):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def header(self):
+        # BOM нужен, чтобы Excel распознал кириллицу.
+        yield '\ufeff' + self.writer.writerow(
+            ('Ингредиент', 'Единицы измерения', 'Количество')
+        )
+
+    def row(self, index, item):
+        return self.writer.writerow((
+            item['name'],
+            item['measurement_unit'],
+            format_amount(item['total']),
+        ))
+
+
+class JsonExporter(TextExporter):
+    content_type = 'application/json'
+    extension = 'json'
+
+    def header(self):
+        yield '['
+
+    def footer(self):
+        yield ']'
+
+    def row(self, index, item):
+        data = json.dumps(
+            {
+                'name': item['name'],
+                'measurement_unit': item['measurement_unit'],
+                'amount': format_amount(item['total']),
+            },
+            ensure_ascii=False,
+        )
+        return data if index == 0 else f',{data}'
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CsvExporter, JsonExporter)
+}
@@ -0,0 +1,44 @@
+from rest_framework import serializers
+
+from foodgram.images import FORMATS, RENDITIONS
+
+
+class ImageRenditionsField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки рецепта.
+
+    Пока копии не готовы, для каждого размера отдаётся оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        storage = recipe.image.storage
+        sizes = recipe.image_renditions.get('sizes')
+        if recipe.image_renditions.get('source') != recipe.image.name:
+            sizes = None
+        if not sizes:
+            original = self.build_url(recipe.image.url)
+            return {
+                size: {extension: original for extension in FORMATS}
+                for size in RENDITIONS
+            }
+        representation = {}
+        for size, rendition in sizes.items():
+            representation[size] = {
+                'width': rendition['width'],
+                'height': rendition['height'],
+            }
+            for extension in FORMATS:
+                representation[size][extension] = self.build_url(
+                    storage.url(rendition[extension])
+                )
+        return representation
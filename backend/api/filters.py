@@ -16,6 +16,13 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
 
+# Порядок выдачи по ?ordering=, каждый покрыт индексом Recipe.
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
 class RecipesFilter(FilterSet):
     """Фильтр рецептов для тегов, избранного и списка покупок."""
 
@@ -28,10 +35,18 @@ class RecipesFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'Набирающие популярность'),
+        ),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
 
     def get_filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -44,3 +59,6 @@ class RecipesFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
@@ -0,0 +1,337 @@
+"""Индексы и снимки в памяти процесса для ответов без запросов к БД.
+
+Индекс строится лениво при первом обращении и перестраивается после
+изменения исходных таблиц. Версия хранится в кэше Django, поэтому
+при общем кэше все воркеры узнают об изменениях; кроме того, индекс
+перестраивается не реже, чем раз в ttl секунд.
+"""
+import hashlib
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from heapq import nsmallest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import bump_version, get_version
+from api.serializers import IngredientSerializer, TagSerializer
+from foodgram.models import Ingredient, IngredientInRecipe, Tag
+from foodgram.search import normalize
+
+
+class InMemoryIndex:
+    """Базовый класс: версия, ttl и потокобезопасная перестройка."""
+
+    version_key = None
+
+    def __init__(self, ttl, version_key=None):
+        self.ttl = ttl
+        self.version_key = version_key or self.version_key
+        self.lock = threading.Lock()
+        self.data = None
+        self.version = None
+        self.built_at = 0
+
+    def build(self):
+        raise NotImplementedError
+
+    def update(self, version):
+        """Доводит self.data до version без полной перестройки.
+
+        Возвращает False, если это невозможно и нужен build().
+        """
+        return False
+
+    def invalidate(self):
+        bump_version(self.version_key)
+        with self.lock:
+            self.data = None
+
+    def stale(self, version):
+        return (self.data is None or version != self.version
+                or time.monotonic() - self.built_at > self.ttl)
+
+    def get(self):
+        version = get_version(self.version_key)
+        data = self.data
+        if self.stale(version):
+            with self.lock:
+                if self.stale(version):
+                    if (self.data is None
+                            or time.monotonic() - self.built_at > self.ttl
+                            or not self.update(version)):
+                        self.data = self.build()
+                        self.built_at = time.monotonic()
+                    self.version = version
+                # Вне блокировки invalidate() может обнулить self.data.
+                data = self.data
+        return data
+
+
+class Snapshot(InMemoryIndex):
+    """Готовый JSON справочника и его ETag."""
+
+    def __init__(self, queryset, serializer_class, **kwargs):
+        super().__init__(**kwargs)
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+
+    def build(self):
+        content = JSONRenderer().render(
+            self.serializer_class(self.queryset.all(), many=True).data
+        )
+        return {
+            'content': content,
+            'etag': quote_etag(hashlib.sha256(content).hexdigest()),
+        }
+
+
+class IngredientIndex(InMemoryIndex):
+    """Автодополнение ингредиентов по названию.
+
+    Сначала идут совпадения с начала названия, затем с начала
+    любого слова, затем вхождения в середину слова. Внутри группы
+    короткие названия выше длинных.
+    """
+
+    version_key = 'ingredient-index-version'
+
+    def build(self):
+        rows = sorted(
+            (normalize(name), pk, name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        words = sorted(
+            (match.group(), position)
+            for position, row in enumerate(rows)
+            for match in re.finditer(r'\w+', row[0])
+            if match.start()
+        )
+        return {
+            'rows': rows,
+            'keys': [row[0] for row in rows],
+            'words': words,
+            'word_keys': [word for word, _ in words],
+        }
+
+    @staticmethod
+    def prefix_range(keys, query):
+        return bisect_left(keys, query), bisect_left(keys, query + '\uffff')
+
+    def search(self, query, limit):
+        query = normalize(query)
+        data = self.get()
+        rows = data['rows']
+        if not query:
+            return [self.to_dict(row) for row in rows[:limit]]
+
+        start, end = self.prefix_range(data['keys'], query)
+        found = list(range(start, end))
+        ranked = nsmallest(limit, found, key=lambda i: (len(rows[i][0]), i))
+
+        if len(ranked) < limit:
+            seen = set(found)
+            start, end = self.prefix_range(data['word_keys'], query)
+            words = {
+                position for _, position in data['words'][start:end]
+                if position not in seen
+            }
+            ranked += nsmallest(
+                limit - len(ranked), words,
+                key=lambda i: (len(rows[i][0]), i)
+            )
+            seen |= words
+            if len(ranked) < limit:
+                contains = [
+                    position for position, row in enumerate(rows)
+                    if position not in seen and query in row[0]
+                ]
+                ranked += nsmallest(
+                    limit - len(ranked), contains,
+                    key=lambda i: (rows[i][0].find(query),
+                                   len(rows[i][0]), i)
+                )
+        return [self.to_dict(rows[position]) for position in ranked]
+
+    @staticmethod
+    def to_dict(row):
+        return {'id': row[1], 'name': row[2], 'measurement_unit': row[3]}
+
+
+class PantryIndex(InMemoryIndex):
+    """Инвертированный индекс ингредиент -> рецепты для «что приготовить».
+
+    Покрытие считается счётчиком по спискам рецептов имеющихся
+    ингредиентов, без GROUP BY по таблице ингредиентов рецептов.
+    Списки разбиты по числу ингредиентов рецепта: внутри группы порядок
+    по покрытию совпадает с порядком по счётчику, и лучшие рецепты
+    группы выбираются most_common без сортировки всех кандидатов.
+
+    Изменённый рецепт публикуется под новой версией индекса, и воркеры
+    переносят в свои списки только его; build() нужен при старте, после
+    ttl и если записи об изменениях пропали из кэша.
+    """
+
+    version_key = 'pantry-index-version'
+    change_key = 'pantry-index-change:{}'
+    max_changes = 100
+
+    def build(self):
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.values_list(
+            'recipe_id', 'ingredients_id'
+        ).order_by().iterator():
+            recipes[recipe_id].append(ingredient_id)
+        postings = defaultdict(lambda: defaultdict(lambda: array('q')))
+        for recipe_id, recipe_ingredients in recipes.items():
+            size = len(recipe_ingredients)
+            for ingredient_id in recipe_ingredients:
+                postings[ingredient_id][size].append(recipe_id)
+        return {
+            'recipes': {
+                recipe_id: tuple(recipe_ingredients)
+                for recipe_id, recipe_ingredients in recipes.items()
+            },
+            'postings': {
+                ingredient_id: dict(by_size)
+                for ingredient_id, by_size in postings.items()
+            },
+        }
+
+    def recipe_changed(self, recipe_id):
+        """Публикует изменение ингредиентов рецепта, после коммита."""
+        version = bump_version(self.version_key)
+        cache.set(self.change_key.format(version), recipe_id, self.ttl)
+
+    def update(self, version):
+        """Перечитывает из БД только рецепты, изменённые с self.version.
+
+        Списки не меняются на месте: их читают параллельные запросы,
+        поэтому затронутые копируются, а self.data заменяется целиком.
+        """
+        if not 0 < version - self.version <= self.max_changes:
+            return False
+        keys = [self.change_key.format(number)
+                for number in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        recipe_ids = set(changes.values())
+        fresh = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredients_id').order_by():
+            fresh[recipe_id].append(ingredient_id)
+
+        recipes = dict(self.data['recipes'])
+        postings = dict(self.data['postings'])
+        copied = set()
+
+        def lists(ingredient_id):
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = dict(postings.get(ingredient_id, {}))
+            return postings[ingredient_id]
+
+        for recipe_id in recipe_ids:
+            old = recipes.pop(recipe_id, ())
+            for ingredient_id in old:
+                by_size = lists(ingredient_id)
+                remaining = array('q', (
+                    other for other in by_size.get(len(old), ())
+                    if other != recipe_id
+                ))
+                if remaining:
+                    by_size[len(old)] = remaining
+                else:
+                    by_size.pop(len(old), None)
+            new = fresh.get(recipe_id)
+            if new:
+                recipes[recipe_id] = tuple(new)
+                for ingredient_id in new:
+                    by_size = lists(ingredient_id)
+                    by_size[len(new)] = (
+                        by_size.get(len(new), array('q'))
+                        + array('q', (recipe_id,))
+                    )
+        for ingredient_id in copied:
+            if not postings[ingredient_id]:
+                del postings[ingredient_id]
+        self.data = {'recipes': recipes, 'postings': postings}
+        return True
+
+    def recipes_with(self, postings, ingredient_id):
+        return {
+            recipe_id
+            for recipe_ids in postings.get(ingredient_id, {}).values()
+            for recipe_id in recipe_ids
+        }
+
+    def search(self, available, include=(), exclude=(), limit=None):
+        """[(recipe_id, доля покрытия, число недостающих)] по убыванию."""
+        postings = self.get()['postings']
+        groups = defaultdict(Counter)
+        for ingredient_id in set(available) | set(include):
+            for size, recipe_ids in postings.get(ingredient_id, {}).items():
+                groups[size].update(recipe_ids)
+        required = None
+        for ingredient_id in include:
+            recipes = self.recipes_with(postings, ingredient_id)
+            required = recipes if required is None else required & recipes
+        excluded = set()
+        for ingredient_id in exclude:
+            excluded |= self.recipes_with(postings, ingredient_id)
+
+        ranked = []
+        for size, counter in groups.items():
+            # Отфильтрованные рецепты отбрасываются после выбора лучших:
+            # выборка растёт, пока после фильтра не наберётся limit.
+            wanted = limit or len(counter)
+            while True:
+                best = counter.most_common(wanted)
+                found = [
+                    (-count / size, size - count, -recipe_id)
+                    for recipe_id, count in best
+                    if recipe_id not in excluded
+                    and (required is None or recipe_id in required)
+                ]
+                if (limit is None or len(found) >= limit
+                        or len(best) < wanted):
+                    break
+                wanted *= 4
+            ranked += found
+        ranked.sort()
+        return [
+            (-recipe_id, -coverage, missing)
+            for coverage, missing, recipe_id in ranked[:limit]
+        ]
+
+
+ingredient_index = IngredientIndex(
+    ttl=getattr(settings, 'INGREDIENT_INDEX_TTL', 300)
+)
+
+pantry_index = PantryIndex(
+    ttl=getattr(settings, 'PANTRY_INDEX_TTL', 600)
+)
+
+tag_snapshot = Snapshot(
+    Tag.objects.all(),
+    TagSerializer,
+    ttl=getattr(settings, 'TAG_SNAPSHOT_TTL', 3600),
+    version_key='tag-snapshot-version',
+)
+ingredient_snapshot = Snapshot(
+    Ingredient.objects.all(),
+    IngredientSerializer,
+    ttl=getattr(settings, 'INGREDIENT_INDEX_TTL', 300),
+    version_key='ingredient-snapshot-version',
+)
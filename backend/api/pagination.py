@@ -1,8 +1,190 @@
+import base64
+import binascii
+import hashlib
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FullResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.cache import bump_version, get_version
+
+
+COUNT_GENERATION_KEY = 'pagination-count-generation'
+
+
+def invalidate_counts():
+    """Сбрасывает все закэшированные COUNT(*) пагинации.
+
+    Поколение растёт после коммита: иначе параллельный COUNT успел бы
+    положить старое число строк под новым поколением.
+    """
+    transaction.on_commit(partial(bump_version, COUNT_GENERATION_KEY))
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, кэширующий count по сигнатуре фильтров queryset.
+
+    Сигнатура — таблица и скомпилированное условие WHERE с
+    параметрами, поэтому одинаково отфильтрованные списки разных
+    запросов делят один COUNT(*). Ключ содержит поколение, которое
+    увеличивается при изменении рецептов, избранного, корзин и
+    подписок. При estimate=True нефильтрованный список на PostgreSQL
+    берёт оценку числа строк из pg_class вместо точного подсчёта.
+    """
+
+    def __init__(self, *args, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return len(self.object_list)
+        compiler = query.get_compiler(self.object_list.db)
+        try:
+            where, params = compiler.compile(query.where)
+        except FullResultSet:
+            where, params = '', ()
+        if not where and self.estimate:
+            estimated = self.estimated_count()
+            if estimated is not None:
+                return estimated
+        signature = hashlib.md5(json.dumps(
+            [query.model._meta.label, where, query.distinct],
+        ).encode() + repr(tuple(params)).encode()).hexdigest()
+        key = (f'pagination-count:{get_version(COUNT_GENERATION_KEY)}:'
+               f'{signature}')
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_TTL)
+        return count
+
+    def estimated_count(self):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [self.object_list.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.PAGINATION_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с keyset-режимом для бесконечной ленты.
+
+    Keyset-режим включается параметром ?pagination=cursor или наличием
+    ?cursor= у list-запросов вью, где задан keyset_ordering. Вместо
+    номера страницы клиент передаёт непрозрачный курсор из поля next;
+    COUNT(*) и OFFSET не выполняются, поэтому глубокие страницы
+    отдаются так же быстро, как первая.
+    """
 
     page_size_query_param = 'limit'
     page_query_param = 'page'
     page_size = 6
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Неверный курсор.'
+    django_paginator_class = CachedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_ordering = None
+        if (getattr(view, 'action', None) == 'list'
+                and getattr(view, 'keyset_ordering', None)
+                and (request.query_params.get(self.mode_query_param)
+                     == 'cursor'
+                     or self.cursor_query_param in request.query_params)):
+            self.keyset_ordering = view.keyset_ordering
+            return self.paginate_keyset(queryset, request)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            estimate=(settings.PAGINATION_ESTIMATED_COUNT
+                      and not request.user.is_authenticated),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_ordering:
+            return Response({
+                'next': self.next_link,
+                'previous': None,
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
+    def paginate_keyset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        fields = [name.lstrip('-') for name in self.keyset_ordering]
+        queryset = queryset.order_by(*self.keyset_ordering)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param), queryset
+        )
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        results = list(queryset[:page_size + 1])
+        self.next_link = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_link = replace_query_param(
+                remove_query_param(
+                    request.build_absolute_uri(), self.page_query_param
+                ),
+                self.cursor_query_param,
+                self.encode_cursor([
+                    queryset.model._meta.get_field(field).value_to_string(
+                        results[-1]
+                    )
+                    for field in fields
+                ]),
+            )
+        return results
+
+    def keyset_filter(self, position):
+        """(a, b) < (va, vb) в порядке keyset_ordering без row-values."""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.keyset_ordering, position):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def decode_cursor(self, cursor, queryset):
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.keyset_ordering):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(
+                    name.lstrip('-')
+                ).to_python(value)
+                for name, value in zip(self.keyset_ordering, values)
+            ]
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
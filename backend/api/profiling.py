@@ -0,0 +1,263 @@
+"""Число запросов к БД и время ответа по каждому вью.
+
+ProfilingMiddleware считает запросы и время БД через execute_wrapper,
+время рендеринга ответа и его размер; время сериализации данных
+замеряет SerializerTimingMixin сериализаторов ответа. Итоги отдаются заголовком
+Server-Timing и копятся в METRICS, который вью metrics выводит в
+текстовом формате Prometheus. Счётчики живут в памяти процесса, так
+что у каждого воркера gunicorn они свои. Метрики видны персоналу и
+адресам из METRICS_ALLOWED_IPS.
+
+Превышение QUERY_BUDGETS пишется в лог, а при QUERY_BUDGET_STRICT
+(например, в тестах) ответ падает с QueryBudgetExceeded.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    """Запросы к БД и время одного запроса к API."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.serialize_time = 0
+        self.serializing = False
+        self.render_time = 0
+        self.render_started = None
+
+    def record(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def rendered(self, response):
+        self.render_time += time.perf_counter() - self.render_started
+
+
+class SerializerTimingMixin:
+    """Относит to_representation сериализатора ко времени сериализации.
+
+    Без этого оно попадает во время самого вью, а render — только
+    перевод готовых данных в JSON. Вложенные сериализаторы и элементы
+    many=True внутри замеряемого не считаются повторно.
+    """
+
+    def to_representation(self, instance):
+        stats = getattr(self.context.get('request'), 'profiling', None)
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serialize_time += time.perf_counter() - started
+            stats.serializing = False
+
+
+class Metrics:
+    """Накопленные по вью счётчики в формате Prometheus."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.views = defaultdict(lambda: {
+                'buckets': [0] * len(DURATION_BUCKETS),
+                'count': 0,
+                'duration': 0,
+                'queries': 0,
+                'queries_max': 0,
+                'db': 0,
+                'serialize': 0,
+                'render': 0,
+                'bytes': 0,
+                'over_budget': 0,
+            })
+
+    def observe(self, view, method, status, duration, stats, size,
+                over_budget):
+        with self.lock:
+            self.requests[view, method, f'{status // 100}xx'] += 1
+            metrics = self.views[view, method]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics['buckets'][index] += 1
+            metrics['count'] += 1
+            metrics['duration'] += duration
+            metrics['queries'] += stats.queries
+            metrics['queries_max'] = max(metrics['queries_max'],
+                                         stats.queries)
+            metrics['db'] += stats.db_time
+            metrics['serialize'] += stats.serialize_time
+            metrics['render'] += stats.render_time
+            metrics['bytes'] += size or 0
+            metrics['over_budget'] += over_budget
+
+    @staticmethod
+    def labels(**labels):
+        return '{' + ','.join(
+            f'{name}="{value}"' for name, value in labels.items()
+        ) + '}'
+
+    def render(self):
+        lines = [
+            '# HELP foodgram_http_requests_total Запросы к API.',
+            '# TYPE foodgram_http_requests_total counter',
+        ]
+        with self.lock:
+            requests = sorted(self.requests.items())
+            views = sorted(
+                (key, {**value, 'buckets': list(value['buckets'])})
+                for key, value in self.views.items()
+            )
+        for (view, method, status), count in requests:
+            lines.append(
+                'foodgram_http_requests_total'
+                f'{self.labels(view=view, method=method, status=status)} '
+                f'{count}'
+            )
+        lines += [
+            '# HELP foodgram_http_request_duration_seconds Время ответа.',
+            '# TYPE foodgram_http_request_duration_seconds histogram',
+        ]
+        for (view, method), metrics in views:
+            for bound, count in zip(DURATION_BUCKETS, metrics['buckets']):
+                lines.append(
+                    'foodgram_http_request_duration_seconds_bucket'
+                    f'{self.labels(view=view, method=method, le=bound)} '
+                    f'{count}'
+                )
+            labels = self.labels(view=view, method=method)
+            lines += [
+                'foodgram_http_request_duration_seconds_bucket'
+                f'{self.labels(view=view, method=method, le="+Inf")} '
+                f'{metrics["count"]}',
+                f'foodgram_http_request_duration_seconds_sum{labels} '
+                f'{metrics["duration"]:.6f}',
+                f'foodgram_http_request_duration_seconds_count{labels} '
+                f'{metrics["count"]}',
+            ]
+        for name, key, kind, help_text in (
+            ('db_queries_total', 'queries', 'counter', 'Запросы к БД.'),
+            ('db_queries_max', 'queries_max', 'gauge',
+             'Наибольшее число запросов к БД за один ответ.'),
+            ('db_duration_seconds_total', 'db', 'counter', 'Время БД.'),
+            ('serialize_duration_seconds_total', 'serialize', 'counter',
+             'Время построения данных ответа сериализаторами.'),
+            ('render_duration_seconds_total', 'render', 'counter',
+             'Время рендеринга ответа в JSON.'),
+            ('http_response_bytes_total', 'bytes', 'counter',
+             'Размер ответов без потоковых.'),
+            ('query_budget_exceeded_total', 'over_budget', 'counter',
+             'Ответы сверх бюджета запросов к БД.'),
+        ):
+            lines += [
+                f'# HELP foodgram_{name} {help_text}',
+                f'# TYPE foodgram_{name} {kind}',
+            ]
+            for (view, method), metrics in views:
+                value = metrics[key]
+                if isinstance(value, float):
+                    value = f'{value:.6f}'
+                lines.append(
+                    f'foodgram_{name}'
+                    f'{self.labels(view=view, method=method)} {value}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def get_query_budget(method, view):
+    budgets = settings.QUERY_BUDGETS
+    return budgets.get(
+        f'{method} {view}',
+        budgets.get(view, settings.QUERY_BUDGET_DEFAULT),
+    )
+
+
+class ProfilingMiddleware:
+    """Замеряет запросы к БД, время и размер каждого ответа."""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = request.profiling = RequestStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(stats.record)
+                )
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        budget = get_query_budget(request.method, view)
+        over_budget = stats.queries > budget
+        size = None if response.streaming else len(response.content)
+        METRICS.observe(view, request.method, response.status_code,
+                        duration, stats, size, over_budget)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};'
+                f'desc="{stats.queries} queries", '
+                f'serialize;dur={stats.serialize_time * 1000:.1f}, '
+                f'render;dur={stats.render_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        if over_budget:
+            message = (f'{request.method} {view}: {stats.queries} запросов '
+                       f'к БД при бюджете {budget}')
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_template_response(self, request, response):
+        """Рендеринг DRF-ответа идёт после вью: время считается отдельно."""
+        stats = getattr(request, 'profiling', None)
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+            response.add_post_render_callback(stats.rendered)
+        return response
+
+
+def metrics(request):
+    """Счётчики процесса в текстовом формате Prometheus."""
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR')
+            in settings.METRICS_ALLOWED_IPS):
+        raise PermissionDenied
+    return HttpResponse(
+        METRICS.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
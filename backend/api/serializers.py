@@ -1,21 +1,30 @@
+from functools import partial
+
+from django.conf import settings
 from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, exceptions
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.fields import ImageRenditionsField
+from api.profiling import SerializerTimingMixin
+from api.sparse import SparseFieldsMixin
 from foodgram.models import (Tag, Ingredient, Recipe,
-                             IngredientInRecipe, Favorite, ShoppingCart)
+                             IngredientInRecipe, Favorite, ShoppingCart,
+                             ImageUpload, RecipeSearchTerm, ShoppingListItem,
+                             recipe_amounts)
+from users.models import FeedItem
 from users.serializers import ProfileSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
@@ -23,10 +32,10 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """Вложенный сериализатор RecipeListSerializer."""
-    id = serializers.ReadOnlyField(source='ingredient.id')
-    name = serializers.ReadOnlyField(source='ingredient.name')
+    id = serializers.ReadOnlyField(source='ingredients.id')
+    name = serializers.ReadOnlyField(source='ingredients.name')
     measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit'
+        source='ingredients.measurement_unit'
     )
 
     class Meta:
@@ -39,13 +48,38 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
-    """Сериализатор list, retrieve рецептов."""
+class IngredientAmountSerializer(serializers.ModelSerializer):
+    """Компактный ингредиент рецепта: id и количество."""
+    id = serializers.ReadOnlyField(source='ingredients_id')
+
+    class Meta:
+        model = IngredientInRecipe
+        fields = ('id', 'amount')
+
+
+class RecipeListSerializer(SerializerTimingMixin, SparseFieldsMixin,
+                           serializers.ModelSerializer):
+    """Сериализатор list, retrieve рецептов.
+
+    Ингредиенты, теги и флаги избранного/корзины берутся из
+    prefetch и аннотаций RecipeViewSet.get_queryset, если они есть.
+    """
+    compact_fields = {
+        'author': partial(serializers.PrimaryKeyRelatedField, read_only=True),
+        'tags': partial(
+            serializers.PrimaryKeyRelatedField, many=True, read_only=True,
+        ),
+        'ingredients': partial(
+            IngredientAmountSerializer,
+            source='ingredient', many=True, read_only=True,
+        ),
+    }
     tags = TagSerializer(many=True, read_only=True)
     author = ProfileSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
@@ -58,25 +92,31 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time',
+            'favorites_count',
+            'carts_count',
         )
 
     def get_ingredients(self, obj):
-        ingredients = IngredientInRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredient.all()
         serializer = IngredientInRecipeSerializer(ingredients, many=True)
         return serializer.data
 
-    def get_is_add(self, obj, add):
+    def get_is_add(self, obj, add, annotation):
+        annotated = getattr(obj, annotation, None)
+        if annotated is not None:
+            return annotated
         user = self.context['request'].user
         return (user.is_authenticated
                 and add.objects.filter(user=user, recipe=obj).exists())
 
     def get_is_favorited(self, obj):
-        return self.get_is_add(obj, Favorite)
+        return self.get_is_add(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.get_is_add(obj, ShoppingCart)
+        return self.get_is_add(obj, ShoppingCart, 'is_in_shopping_cart')
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
@@ -89,7 +129,8 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(SerializerTimingMixin,
+                             serializers.ModelSerializer):
     """Сериализотор post, update рецептов."""
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
@@ -97,7 +138,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     )
     author = ProfileSerializer(read_only=True)
     ingredients = AddIngredientSerializer(many=True)
-    image = Base64ImageField()
+    image = Base64ImageField(required=False)
+    image_token = serializers.PrimaryKeyRelatedField(
+        queryset=ImageUpload.objects.all(),
+        write_only=True,
+        required=False,
+    )
     cooking_time = serializers.IntegerField(min_value=1)
 
     class Meta:
@@ -109,10 +155,31 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_token',
             'text',
             'cooking_time',
         )
 
+    def validate_image_token(self, value):
+        if value.user != self.context['request'].user:
+            raise ValidationError('Картинка не найдена.')
+        return value
+
+    def validate(self, data):
+        if 'image' in data and 'image_token' in data:
+            raise ValidationError(
+                'Передайте либо image, либо image_token.'
+            )
+        if self.instance is None and not (
+            data.get('image') or data.get('image_token')
+        ):
+            raise ValidationError({'image': 'Обязательное поле.'})
+        upload = data.pop('image_token', None)
+        if upload is not None:
+            data['image'] = upload.image.name
+            data['image_upload'] = upload
+        return data
+
     def validate_tags(self, value):
         if not value:
             raise ValidationError('Добавьте хотя бы один тэг!')
@@ -131,14 +198,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return value
 
     def fill_amount(self, ingredients, recipe):
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
-        ingredients_dict = {
-            ingredient.id: ingredient
-            for ingredient in Ingredient.objects.filter(id__in=ingredient_ids)
-        }
         ingredients_amount = [
             IngredientInRecipe(
-                ingredient=ingredients_dict[ingredient['id']],
+                ingredients=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             )
@@ -146,24 +208,42 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
         IngredientInRecipe.objects.bulk_create(ingredients_amount)
 
+    @staticmethod
+    def claim_upload(validated_data):
+        """Файл загрузки переходит рецепту, токен больше не нужен."""
+        upload = validated_data.pop('image_upload', None)
+        if upload is not None:
+            upload.delete()
+
     @transaction.atomic
     def create(self, validated_data):
+        self.claim_upload(validated_data)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.fill_amount(recipe=recipe, ingredients=ingredients)
+        RecipeSearchTerm.objects.reindex([recipe])
+        FeedItem.objects.fan_out(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
+        self.claim_upload(validated_data)
         ingredients = validated_data.pop('ingredients', None)
         tags = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
-        instance.ingredients.clear()
-        self.fill_amount(recipe=instance, ingredients=ingredients)
-        instance.tags.set(tags)
-        instance.save()
+        if ingredients is not None:
+            # Старые строки уходят из корзин сигналами удаления, а
+            # bulk_create сигналов не шлёт: новые переносятся вручную.
+            instance.ingredients.clear()
+            self.fill_amount(recipe=instance, ingredients=ingredients)
+            ShoppingListItem.objects.apply_to_carts(
+                instance, recipe_amounts(instance)
+            )
+        if tags is not None:
+            instance.tags.set(tags)
+        RecipeSearchTerm.objects.reindex([instance])
         return instance
 
     def to_representation(self, instance):
@@ -174,6 +254,16 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
+class ImageUploadSerializer(SerializerTimingMixin,
+                            serializers.ModelSerializer):
+    """Загрузка картинки multipart-запросом, ответ — токен для рецепта."""
+    image_token = serializers.UUIDField(source='id', read_only=True)
+
+    class Meta:
+        model = ImageUpload
+        fields = ('image_token', 'image')
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -192,7 +282,8 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'user', 'recipe')
+        fields = ('id', 'user', 'recipe', 'servings')
+        extra_kwargs = {'servings': {'min_value': 1}}
         validators = [
             UniqueTogetherValidator(
                 queryset=ShoppingCart.objects.all(),
@@ -200,3 +291,16 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
                 message='Уже в списке покупок.'
             )
         ]
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT,
+    )
+    servings = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,288 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from api.cache import (AUTHOR_VERSION_KEY, CATALOG_VERSION_KEY,
+                       RECIPE_VERSION_KEY, bump_version)
+from api.indexes import (ingredient_index, ingredient_snapshot, pantry_index,
+                         tag_snapshot)
+from api.pagination import invalidate_counts
+from foodgram.images import (delete_renditions, needs_renditions,
+                             schedule_renditions)
+from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                             RecipeSearchTerm, ShoppingCart,
+                             ShoppingListItem, Tag, UnitConversion,
+                             recipe_amounts, update_counter)
+from users.models import FeedItem, Follow
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    # До коммита параллельный запрос пересобрал бы индекс из старых данных.
+    transaction.on_commit(ingredient_index.invalidate)
+    transaction.on_commit(ingredient_snapshot.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_snapshot(**kwargs):
+    transaction.on_commit(tag_snapshot.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        RecipeSearchTerm.objects.reindex(
+            Recipe.objects.filter(ingredients=instance)
+        )
+
+
+def invalidate_pagination_counts(created=True, **kwargs):
+    """Число строк меняется только при создании и удалении."""
+    if created:
+        invalidate_counts()
+
+
+m2m_changed.connect(invalidate_pagination_counts, sender=Recipe.tags.through)
+for model in (Recipe, Favorite, ShoppingCart, Follow, User):
+    post_save.connect(invalidate_pagination_counts, sender=model)
+    post_delete.connect(invalidate_pagination_counts, sender=model)
+
+
+def bump_on_commit(key):
+    """Версия растёт после коммита, чтобы кэш не поймал старые данные."""
+    transaction.on_commit(partial(bump_version, key))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_detail(instance, **kwargs):
+    bump_on_commit(RECIPE_VERSION_KEY.format(instance.id))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    bump_on_commit(RECIPE_VERSION_KEY.format(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, reverse, pk_set, **kwargs):
+    recipe_ids = (pk_set or ()) if reverse else (instance.id,)
+    for recipe_id in recipe_ids:
+        bump_on_commit(RECIPE_VERSION_KEY.format(recipe_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_profile(instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        bump_on_commit(AUTHOR_VERSION_KEY.format(instance.id))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=UnitConversion)
+def invalidate_catalog(**kwargs):
+    bump_on_commit(CATALOG_VERSION_KEY)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    if needs_renditions(instance):
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_renditions(instance, **kwargs):
+    transaction.on_commit(
+        partial(delete_renditions, instance.image_renditions)
+    )
+
+
+# Денормализованные счётчики: (модель строки, FK, модель и поле счётчика).
+COUNTERS = (
+    (Favorite, 'recipe_id', Recipe, 'favorites_count'),
+    (ShoppingCart, 'recipe_id', Recipe, 'carts_count'),
+    (Recipe, 'author_id', User, 'recipes_count'),
+    (Follow, 'author_id', User, 'followers_count'),
+)
+
+
+def counter_receivers(fk, target, field):
+    def count_created(instance, created, **kwargs):
+        if created and getattr(instance, fk) is not None:
+            update_counter(
+                target.objects.filter(pk=getattr(instance, fk)), field, 1
+            )
+
+    def count_deleted(instance, **kwargs):
+        if getattr(instance, fk) is not None:
+            update_counter(
+                target.objects.filter(pk=getattr(instance, fk)), field, -1
+            )
+
+    return count_created, count_deleted
+
+
+for model, fk, target, field in COUNTERS:
+    count_created, count_deleted = counter_receivers(fk, target, field)
+    post_save.connect(count_created, sender=model, weak=False,
+                      dispatch_uid=f'count_created_{field}')
+    post_delete.connect(count_deleted, sender=model, weak=False,
+                        dispatch_uid=f'count_deleted_{field}')
+
+
+def mark_similar_stale(recipe_id):
+    Recipe.objects.filter(pk=recipe_id).update(similar_stale=True)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+@receiver((post_save, post_delete), sender=Favorite)
+def mark_recipe_similar_stale(instance, **kwargs):
+    mark_similar_stale(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def mark_recipe_ingredients_stale(instance, action, reverse, **kwargs):
+    if not reverse and action.startswith('post_'):
+        mark_similar_stale(instance.id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def mark_trending_stale(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(trending_stale=True)
+
+
+def pantry_recipe_changed(recipe_id):
+    transaction.on_commit(partial(pantry_index.recipe_changed, recipe_id))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def update_pantry_index(instance, **kwargs):
+    pantry_recipe_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_pantry_index_m2m(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        pantry_recipe_changed(instance.id)
+    elif pk_set:
+        for recipe_id in pk_set:
+            pantry_recipe_changed(recipe_id)
+    else:
+        # ingredient.recipes.clear(): какие рецепты затронуты, неизвестно.
+        transaction.on_commit(pantry_index.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def update_pantry_index_on_create(instance, created, **kwargs):
+    """Ингредиенты нового рецепта пишутся bulk_create без сигналов."""
+    if created:
+        pantry_recipe_changed(instance.id)
+
+
+def saved_row(instance, *fields):
+    """Значения полей строки до сохранения или None для новой."""
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance).objects.filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remember_cart(instance, **kwargs):
+    instance.saved_cart = saved_row(instance, 'user_id', 'recipe_id',
+                                    'servings')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def update_shopping_list(instance, **kwargs):
+    old = getattr(instance, 'saved_cart', None)
+    servings = instance.servings
+    if old is not None:
+        user_id, recipe_id, old_servings = old
+        if (user_id, recipe_id) == (instance.user_id, instance.recipe_id):
+            servings -= old_servings
+        else:
+            ShoppingListItem.objects.apply_carts(
+                user_id, {recipe_id: -old_servings}
+            )
+    ShoppingListItem.objects.apply_carts(
+        instance.user_id, {instance.recipe_id: servings}
+    )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remember_cart_amounts(instance, **kwargs):
+    # pre_delete приходит до каскадного удаления ингредиентов рецепта.
+    instance.saved_amounts = recipe_amounts(
+        instance.recipe_id, -instance.servings
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shrink_shopping_list(instance, **kwargs):
+    ShoppingListItem.objects.apply(
+        [instance.user_id], getattr(instance, 'saved_amounts', {})
+    )
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_recipe_ingredient(instance, **kwargs):
+    instance.saved_amount = saved_row(instance, 'recipe_id',
+                                      'ingredients_id', 'amount')
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def update_carts_ingredient(instance, **kwargs):
+    old = getattr(instance, 'saved_amount', None)
+    if old is not None:
+        recipe_id, ingredient_id, amount = old
+        ShoppingListItem.objects.apply_to_carts(
+            recipe_id, {ingredient_id: -amount}
+        )
+    ShoppingListItem.objects.apply_to_carts(
+        instance.recipe_id, {instance.ingredients_id: instance.amount}
+    )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def remove_carts_ingredient(instance, origin=None, **kwargs):
+    origin_model = (
+        origin.model if isinstance(origin, QuerySet) else type(origin)
+    )
+    if origin_model in (Recipe, User):
+        # Корзины с рецептом удаляются тем же каскадом, их сигналы
+        # уже вычли рецепт целиком.
+        return
+    ShoppingListItem.objects.apply_to_carts(
+        instance.recipe_id, {instance.ingredients_id: -instance.amount}
+    )
+
+
+@receiver(pre_save, sender=Follow)
+def remember_follow(instance, **kwargs):
+    instance.saved_follow = saved_row(instance, 'user_id', 'author_id')
+
+
+@receiver(post_save, sender=Follow)
+def update_feed(instance, **kwargs):
+    old = getattr(instance, 'saved_follow', None)
+    if old == (instance.user_id, instance.author_id):
+        return
+    if old is not None:
+        FeedItem.objects.unfollow(*old)
+    FeedItem.objects.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(instance, **kwargs):
+    FeedItem.objects.unfollow(instance.user_id, instance.author_id)
@@ -0,0 +1,80 @@
+"""Выбор полей ответа параметрами ?fields= и ?expand=.
+
+fields=id,name,author оставляет в ответе только перечисленные поля.
+Вложенные объекты из compact_fields сериализатора при этом отдаются
+компактно (id), а полностью — только если перечислены в expand. Без
+fields ответ прежний, со всеми полями. Вью по wants() решает, какие
+prefetch и аннотации нужны, чтобы не делать запросы для лишних полей.
+"""
+from functools import cached_property
+
+from rest_framework.exceptions import ValidationError
+
+
+def split_param(query_params, name):
+    return [
+        value.strip()
+        for values in query_params.getlist(name)
+        for value in values.split(',') if value.strip()
+    ]
+
+
+class SparseFieldsMixin:
+    """Сериализатор с выбором полей через аргументы fields и expand."""
+
+    compact_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.only_fields = fields
+        self.expand = set(expand)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.only_fields is None:
+            return fields
+        wanted = set(self.only_fields) | self.expand
+        unknown = wanted - fields.keys()
+        if unknown:
+            raise ValidationError(
+                {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'}
+            )
+        for name in list(fields):
+            if name not in wanted:
+                del fields[name]
+            elif name in self.compact_fields and name not in self.expand:
+                fields[name] = self.compact_fields[name]()
+        return fields
+
+
+class SparseFieldsViewMixin:
+    """Передаёт ?fields= и ?expand= сериализатору GET-ответов."""
+
+    sparse_actions = ('list', 'retrieve')
+
+    @cached_property
+    def sparse_fields(self):
+        """(fields, expand) из запроса или (None, ()) для полного ответа."""
+        if (self.action not in self.sparse_actions
+                or self.request.method != 'GET'):
+            return None, ()
+        fields = split_param(self.request.query_params, 'fields')
+        if not fields:
+            return None, ()
+        return fields, split_param(self.request.query_params, 'expand')
+
+    def wants(self, name, expanded=False):
+        """Нужно ли поле в ответе; expanded — нужно ли целиком."""
+        fields, expand = self.sparse_fields
+        if fields is None or name in expand:
+            return True
+        return not expanded and name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.sparse_fields
+        if fields is not None and issubclass(
+            self.get_serializer_class(), SparseFieldsMixin
+        ):
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from foodgram.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+User = get_user_model()
+
+
+@override_settings(PROFILING_ENABLED=True, QUERY_BUDGET_STRICT=True)
+class FoodgramTestCase(TestCase):
+    """Юзеры, теги и ингредиенты, общие для тестов API.
+
+    Запросы сверх QUERY_BUDGETS валят тест исключением.
+    """
+
+    users_count = 3
+    tags_count = 3
+    ingredients_count = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            cls.create_user(index) for index in range(cls.users_count)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag{index}')
+            for index in range(cls.tags_count)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(cls.ingredients_count)
+        ]
+
+    @staticmethod
+    def create_user(index, **fields):
+        return User.objects.create_user(
+            username=f'user{index}',
+            email=f'user{index}@example.com',
+            first_name=f'Имя{index}',
+            last_name=f'Фамилия{index}',
+            password='password',
+            **fields,
+        )
+
+    @staticmethod
+    def create_recipe(author, name='Рецепт', tags=(), ingredients=(),
+                      amount=1, **fields):
+        """Рецепт с тегами и ингредиентами, по amount каждого."""
+        fields = {'image': 'recipes/test.png', 'text': 'Описание',
+                  'cooking_time': 10, **fields}
+        recipe = Recipe.objects.create(author=author, name=name, **fields)
+        recipe.tags.set(tags)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredients=ingredient,
+                               amount=amount)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    @staticmethod
+    def client_for(user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
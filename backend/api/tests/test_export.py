@@ -0,0 +1,75 @@
+import csv
+import json
+from io import StringIO
+
+from api.tests.base import FoodgramTestCase
+from foodgram.models import ShoppingCart
+
+
+class ShoppingListExportTest(FoodgramTestCase):
+    """Выгрузка списка покупок в каждом формате и её ETag."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = cls.users[0]
+        cls.recipe = cls.create_recipe(
+            cls.users[1], ingredients=cls.ingredients[:2], amount=150
+        )
+        cls.other = cls.create_recipe(
+            cls.users[1], name='Другой', ingredients=cls.ingredients[1:2],
+            amount=50,
+        )
+
+    def setUp(self):
+        self.client = self.client_for(self.user)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+
+    def download(self, export_type, **headers):
+        return self.client.get(self.url, {'type': export_type}, **headers)
+
+    @staticmethod
+    def content(response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_formats(self):
+        rows = [['Ингредиент 0', 'г', '150'], ['Ингредиент 1', 'г', '150']]
+        response = self.download('txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), '\n'.join(
+            f'- {name} ({unit}) - {amount}' for name, unit, amount in rows
+        ))
+        self.assertIn('.txt"', response['Content-Disposition'])
+
+        response = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = self.content(response)
+        self.assertTrue(content.startswith('\ufeff'))
+        self.assertEqual(
+            list(csv.reader(StringIO(content[1:]))),
+            [['Ингредиент', 'Единицы измерения', 'Количество'], *rows],
+        )
+
+        response = self.download('json')
+        self.assertEqual(json.loads(self.content(response)), [
+            {'name': name, 'measurement_unit': unit, 'amount': int(amount)}
+            for name, unit, amount in rows
+        ])
+
+    def test_unknown_format_and_empty_list(self):
+        self.assertEqual(self.download('pdf').status_code, 400)
+        ShoppingCart.objects.all().delete()
+        self.assertEqual(self.download('txt').status_code, 400)
+
+    def test_etag(self):
+        etag = self.download('txt')['ETag']
+        self.assertNotEqual(self.download('csv')['ETag'], etag)
+        response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        ShoppingCart.objects.create(user=self.user, recipe=self.other)
+        response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Ингредиент 1 (г) - 200', self.content(response))
@@ -0,0 +1,55 @@
+from api.tests.base import FoodgramTestCase
+from users.models import FeedItem, Follow
+
+
+class FeedTest(FoodgramTestCase):
+    """Лента подписчика следует за подписками при любом их изменении."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user, cls.first, cls.second = cls.users
+        cls.recipes = {
+            author.id: [
+                cls.create_recipe(author, name=f'Рецепт {index}').id
+                for index in range(2)
+            ]
+            for author in (cls.first, cls.second)
+        }
+
+    def feed(self):
+        return sorted(FeedItem.objects.filter(
+            user=self.user
+        ).values_list('recipe_id', flat=True))
+
+    def expected(self, *authors):
+        return sorted(
+            recipe_id for author in authors
+            for recipe_id in self.recipes[author.id]
+        )
+
+    def test_subscribe_and_unsubscribe(self):
+        client = self.client_for(self.user)
+        url = f'/api/users/{self.first.id}/subscribe/'
+        self.assertEqual(client.post(url).status_code, 201)
+        self.assertEqual(self.feed(), self.expected(self.first))
+        response = client.get('/api/users/subscriptions/')
+        self.assertEqual(len(response.json()['results'][0]['recipes']), 2)
+        self.assertEqual(client.delete(url).status_code, 204)
+        self.assertEqual(self.feed(), [])
+
+    def test_direct_edits_are_applied(self):
+        # Так подписки меняет админка: save() и delete() по одной.
+        follow = Follow.objects.create(user=self.user, author=self.first)
+        self.assertEqual(self.feed(), self.expected(self.first))
+        follow.author = self.second
+        follow.save()
+        self.assertEqual(self.feed(), self.expected(self.second))
+        follow.delete()
+        self.assertEqual(self.feed(), [])
+
+    def test_author_deletion_clears_feed(self):
+        for author in (self.first, self.second):
+            Follow.objects.create(user=self.user, author=author)
+        self.first.delete()
+        self.assertEqual(self.feed(), self.expected(self.second))
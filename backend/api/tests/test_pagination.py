@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.pagination import CachedCountPaginator
+from api.tests.base import FoodgramTestCase
+from foodgram.models import Recipe
+from users.models import Follow
+
+
+class KeysetPaginationTest(FoodgramTestCase):
+    """Курсорные страницы проходят список без пропусков и повторов."""
+
+    users_count = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Одинаковые даты: порядок страниц держится на id.
+        now = timezone.now()
+        for index in range(7):
+            cls.create_recipe(cls.users[0], name=f'Рецепт {index}',
+                              pub_date=now)
+        for author in cls.users[1:]:
+            Follow.objects.create(user=cls.users[0], author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.users[0])
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            self.assertLessEqual(len(data['results']), 3)
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        return ids
+
+    def test_recipes(self):
+        self.assertEqual(
+            self.walk('/api/recipes/?pagination=cursor&limit=3'),
+            list(Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )),
+        )
+
+    def test_popular_recipes(self):
+        for recipe in Recipe.objects.all()[:3]:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=recipe.pk % 2 + 1
+            )
+        self.assertEqual(
+            self.walk('/api/recipes/?pagination=cursor&limit=3'
+                      '&ordering=popular'),
+            list(Recipe.objects.order_by('-favorites_count', '-id')
+                 .values_list('id', flat=True)),
+        )
+
+    def test_subscriptions(self):
+        self.assertEqual(
+            self.walk('/api/users/subscriptions/?pagination=cursor&limit=3'),
+            [user.id for user in reversed(self.users[1:])],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=bm90LWpzb24=')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers_are_kept(self):
+        data = self.client.get('/api/recipes/?limit=3&page=3').json()
+        self.assertEqual(data['count'], 7)
+        self.assertEqual(len(data['results']), 1)
+
+
+class CountTest(FoodgramTestCase):
+    """COUNT(*) страниц кэшируется до изменения данных или оценивается."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(3):
+            cls.create_recipe(cls.users[index], name=f'Рецепт {index}',
+                              tags=cls.tags[:index + 1])
+
+    def setUp(self):
+        cache.clear()
+
+    def count(self, query='', user=None, counted=True):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client_for(user).get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            any('COUNT(' in query['sql'] for query in captured), counted
+        )
+        return response.json()['count']
+
+    def test_count_is_cached_until_change(self):
+        self.assertEqual(self.count('tags=tag2'), 1)
+        self.assertEqual(self.count('tags=tag2', counted=False), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            # Без картинки: после коммита не запускается её обработка.
+            self.create_recipe(self.users[0], tags=self.tags[2:], image='')
+        self.assertEqual(self.count('tags=tag2'), 2)
+        self.assertEqual(self.count(), 4)
+
+    @override_settings(PAGINATION_ESTIMATED_COUNT=True)
+    def test_estimate_for_anonymous_unfiltered_list(self):
+        with mock.patch.object(CachedCountPaginator, 'estimated_count',
+                               return_value=10000):
+            self.assertEqual(self.count(counted=False), 10000)
+            self.assertEqual(self.count('tags=tag0'), 3)
+            self.assertEqual(self.count(user=self.users[0]), 3)
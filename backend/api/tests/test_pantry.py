@@ -0,0 +1,57 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from api.indexes import pantry_index
+from api.tests.base import FoodgramTestCase
+from foodgram.models import IngredientInRecipe
+
+
+class PantryIndexTest(FoodgramTestCase):
+    """Изменение рецепта переносится в индекс без полной перестройки."""
+
+    def setUp(self):
+        cache.clear()
+        pantry_index.data = None
+
+    def create_pantry_recipe(self, ingredients):
+        with self.captureOnCommitCallbacks(execute=True):
+            # Без картинки: после коммита не запускается её обработка.
+            recipe = self.create_recipe(self.users[0], image='')
+            self.set_ingredients(recipe, ingredients)
+        return recipe
+
+    def set_ingredients(self, recipe, ingredients):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients.clear()
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredients=ingredient,
+                                   amount=1)
+                for ingredient in ingredients
+            )
+
+    def test_changes_are_applied_incrementally(self):
+        first = self.create_pantry_recipe(self.ingredients[:2])
+        second = self.create_pantry_recipe(self.ingredients[1:3])
+        pantry_index.get()
+        with mock.patch.object(pantry_index, 'build') as build:
+            self.set_ingredients(first, self.ingredients[2:])
+            third = self.create_pantry_recipe(self.ingredients[:1])
+            with self.captureOnCommitCallbacks(execute=True):
+                second.delete()
+            data = pantry_index.get()
+        build.assert_not_called()
+        expected = pantry_index.build()
+        self.assertEqual(data['recipes'], expected['recipes'])
+        self.assertEqual(
+            {ingredient: {size: sorted(ids) for size, ids in lists.items()}
+             for ingredient, lists in data['postings'].items()},
+            {ingredient: {size: sorted(ids) for size, ids in lists.items()}
+             for ingredient, lists in expected['postings'].items()},
+        )
+        self.assertEqual(
+            [recipe_id for recipe_id, _, _ in pantry_index.search(
+                [self.ingredients[0].id]
+            )],
+            [third.id],
+        )
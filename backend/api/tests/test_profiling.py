@@ -0,0 +1,45 @@
+from django.test import override_settings
+
+from api.profiling import METRICS, QueryBudgetExceeded
+from api.tests.base import FoodgramTestCase
+
+
+@override_settings(SERVER_TIMING=True, METRICS_ALLOWED_IPS=[])
+class ProfilingTest(FoodgramTestCase):
+    """Время сериализации, доступ к /metrics и бюджет запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = cls.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        METRICS.reset()
+
+    def test_serialize_time_is_exported(self):
+        response = self.client_for().get('/api/recipes/')
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        client = self.client_for()
+        client.force_login(self.staff)
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'foodgram_serialize_duration_seconds_total'
+            '{view="recipes-list",method="GET"}',
+            response.content.decode(),
+        )
+
+    def test_metrics_require_staff_or_allowed_ip(self):
+        self.assertEqual(self.client_for().get('/metrics').status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(
+                self.client_for().get('/metrics').status_code, 200
+            )
+
+    def test_query_budget_is_enforced(self):
+        self.create_recipe(self.users[0])
+        client = self.client_for()
+        with self.settings(QUERY_BUDGETS={'recipes-list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                client.get('/api/recipes/')
+        self.assertEqual(client.get('/api/recipes/').status_code, 200)
@@ -0,0 +1,108 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import FoodgramTestCase
+from foodgram.models import (Favorite, RecipeSearchTerm, ShoppingCart,
+                             ShoppingListItem, SimilarRecipe)
+from users.models import FeedItem, Follow
+
+# Полный проход по таблице в плане запроса. В SQLite «SCAN t USING
+# INDEX» — обход индекса в нужном порядке, это не ошибка.
+FULL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+
+class QueryPlanTest(FoodgramTestCase):
+    """Запросы горячих путей API не проходят таблицы целиком.
+
+    Планы строятся для SQL, который вью действительно выполнили.
+    """
+
+    tags_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipes = [
+            cls.create_recipe(
+                cls.users[index % 3], name=f'Салат {index}', image='',
+                tags=cls.tags[:index % 2 + 1],
+                ingredients=cls.ingredients[:index % 4 + 1],
+                amount=index + 1,
+            )
+            for index in range(10)
+        ]
+        RecipeSearchTerm.objects.reindex(recipes)
+        for recipe in recipes[::2]:
+            Favorite.objects.create(user=cls.users[0], recipe=recipe)
+            ShoppingCart.objects.create(user=cls.users[0], recipe=recipe)
+        Follow.objects.create(user=cls.users[0], author=cls.users[1])
+        Follow.objects.create(user=cls.users[0], author=cls.users[2])
+        FeedItem.objects.rebuild()
+        ShoppingListItem.objects.rebuild()
+        SimilarRecipe.objects.rebuild(k=3, max_posting=100, full=True)
+        cls.recipe = recipes[0]
+
+    def urls(self):
+        recipe_id = self.recipe.id
+        return (
+            '/api/recipes/',
+            f'/api/recipes/?author={self.users[1].id}',
+            '/api/recipes/?tags=tag0&tags=tag1',
+            '/api/recipes/?is_favorited=1&tags=tag0',
+            '/api/recipes/?is_in_shopping_cart=1',
+            '/api/recipes/?ordering=popular',
+            '/api/recipes/?ordering=trending',
+            '/api/recipes/search/?q=сал',
+            f'/api/recipes/{recipe_id}/',
+            f'/api/recipes/{recipe_id}/similar/',
+            '/api/users/subscriptions/?recipes_limit=3',
+            '/api/recipes/download_shopping_cart/',
+        )
+
+    def explain(self, sql):
+        prefix = ('EXPLAIN' if connection.vendor == 'postgresql'
+                  else 'EXPLAIN QUERY PLAN')
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            return '\n'.join(str(row) for row in cursor.fetchall())
+
+    def full_scans(self, plan):
+        scans = set(FULL_SCANS[connection.vendor].findall(plan))
+        # Проход по подзапросу или CTE, а не по таблице.
+        derived = set(re.findall(r'(?:CO-ROUTINE|MATERIALIZE) (\w+)', plan))
+        return sorted(scans - derived - {'subquery'})
+
+    def test_hot_paths_use_indexes(self):
+        if connection.vendor not in FULL_SCANS:
+            self.skipTest(f'Планы {connection.vendor} не поддерживаются.')
+        if connection.vendor == 'postgresql':
+            # На маленькой таблице seq scan дешевле индекса; так видно,
+            # есть ли у запроса индексный план вообще.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        client = self.client_for(self.users[0])
+        failed = []
+        for url in self.urls():
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200, url)
+            selects = [
+                query['sql'] for query in captured
+                if query['sql'].lstrip().upper().startswith('SELECT')
+            ]
+            self.assertTrue(selects, url)
+            for sql in selects:
+                scans = self.full_scans(self.explain(sql))
+                if scans:
+                    failed.append(f'{url}: {", ".join(scans)}\n  {sql}')
+        self.assertFalse(failed, 'Полный проход по таблице:\n'
+                         + '\n'.join(failed))
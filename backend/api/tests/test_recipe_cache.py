@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from api.cache import AUTHOR_VERSION_KEY, bump_version
+from api.tests.base import FoodgramTestCase
+from api.views import RecipeViewSet
+from users.models import CustomUser
+
+
+class RecipeDetailCacheTest(FoodgramTestCase):
+    """Кэш рецепта не отдаёт данные, изменённые после его сохранения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = cls.users[0]
+        # Без картинки: сохранение не запускает её обработку.
+        cls.recipe = cls.create_recipe(
+            cls.author, tags=cls.tags[:1], ingredients=cls.ingredients[:1],
+            image='',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def get(self):
+        response = self.client_for().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_invalidate_entry(self):
+        self.get()
+        with self.assertNumQueries(1):
+            self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        self.assertEqual(self.get()['name'], 'Новое название')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Новое имя'
+            self.author.save()
+        self.assertEqual(self.get()['author']['first_name'], 'Новое имя')
+
+    def test_change_during_read_is_not_cached(self):
+        get_object = RecipeViewSet.get_object
+
+        def read_then_change(view):
+            recipe = get_object(view)
+            # Профиль меняется после чтения рецепта, до записи в кэш.
+            CustomUser.objects.filter(pk=self.author.pk).update(
+                first_name='Новое имя'
+            )
+            bump_version(AUTHOR_VERSION_KEY.format(self.author.pk))
+            return recipe
+
+        with mock.patch.object(RecipeViewSet, 'get_object',
+                               read_then_change):
+            self.assertEqual(self.get()['author']['first_name'], 'Имя0')
+        self.assertEqual(self.get()['author']['first_name'], 'Новое имя')
@@ -0,0 +1,114 @@
+from django.core.cache import cache
+
+from api.tests.base import FoodgramTestCase
+from foodgram.models import Favorite, Recipe, RecipeSearchTerm
+from users.models import Follow
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    LIMITS = (1, 5, 20)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(25):
+            recipe = cls.create_recipe(
+                cls.users[index % 3], name=f'Рецепт {index}',
+                tags=cls.tags[:index % 3 + 1],
+                ingredients=cls.ingredients[:index % 4 + 1],
+                amount=index + 1,
+            )
+            if index % 2:
+                Favorite.objects.create(user=cls.users[0], recipe=recipe)
+        Follow.objects.create(user=cls.users[0], author=cls.users[1])
+
+    def assert_constant_queries(self, client, expected):
+        for limit in self.LIMITS:
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(expected):
+                response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous(self):
+        # COUNT, рецепты с авторами, теги, ингредиенты.
+        self.assert_constant_queries(self.client_for(), 4)
+
+    def test_authenticated(self):
+        # Плюс авторы с флагом подписки; флаги рецептов — аннотации.
+        self.assert_constant_queries(self.client_for(self.users[0]), 5)
+
+    def test_counters_are_exposed(self):
+        recipe = Recipe.objects.get(name='Рецепт 1')
+        response = self.client_for().get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['favorites_count'], 1)
+        self.assertEqual(response.json()['author']['followers_count'], 1)
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    """Ранг поиска не зависит от фильтра по тегам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name, tags in (('Салат салат салат', cls.tags[:1]),
+                           ('Салат', cls.tags)):
+            RecipeSearchTerm.objects.reindex([
+                cls.create_recipe(cls.users[0], name=name, tags=tags)
+            ])
+
+    def search(self, query):
+        response = self.client_for().get(f'/api/recipes/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_tag_filter_does_not_inflate_rank(self):
+        expected = ['Салат салат салат', 'Салат']
+        self.assertEqual(self.search('q=салат'), expected)
+        self.assertEqual(
+            self.search('q=салат&tags=tag0&tags=tag1&tags=tag2'), expected
+        )
+
+
+class BulkFavoriteTest(FoodgramTestCase):
+    """Массовое избранное меняет строки и счётчики рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = cls.users[0]
+        cls.recipes = [
+            cls.create_recipe(cls.user, name=f'Рецепт {index}')
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        self.client = self.client_for(self.user)
+
+    def counts(self):
+        return list(Recipe.objects.filter(
+            id__in=[recipe.id for recipe in self.recipes]
+        ).order_by('id').values_list('favorites_count', flat=True))
+
+    def test_add_and_remove(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        response = self.client.post('/api/recipes/favorite/',
+                                    {'ids': [first, second]}, format='json')
+        self.assertEqual(response.json()['added'], [second])
+        self.assertEqual(response.json()['exists'], [first])
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+        response = self.client.delete('/api/recipes/favorite/',
+                                      {'ids': [first, third]}, format='json')
+        self.assertEqual(response.json(), {'removed': [first],
+                                           'not_found': [third]})
+        self.assertEqual(self.counts(), [0, 1, 0])
+        self.assertTrue(Recipe.objects.get(pk=first).trending_stale)
+        self.assertEqual(
+            list(Favorite.objects.values_list('recipe_id', flat=True)),
+            [second],
+        )
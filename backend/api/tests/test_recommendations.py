@@ -0,0 +1,33 @@
+from api.tests.base import FoodgramTestCase
+from foodgram.models import Favorite, SimilarRecipe
+
+
+class RecommendedTest(FoodgramTestCase):
+    """Ранг рекомендаций не зависит от фильтра по тегам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user, author, _ = cls.users
+        liked = cls.create_recipe(author, name='Любимый')
+        Favorite.objects.create(user=cls.user, recipe=liked)
+        for name, tags, score in (('Близкий', cls.tags[:1], 0.8),
+                                  ('Дальний', cls.tags, 0.5)):
+            SimilarRecipe.objects.create(
+                recipe=liked, score=score,
+                similar=cls.create_recipe(author, name=name, tags=tags),
+            )
+
+    def recommended(self, query=''):
+        response = self.client_for(self.user).get(
+            f'/api/recipes/recommended/?{query}'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_tag_filter_does_not_inflate_rank(self):
+        expected = ['Близкий', 'Дальний']
+        self.assertEqual(self.recommended(), expected)
+        self.assertEqual(
+            self.recommended('tags=tag0&tags=tag1&tags=tag2'), expected
+        )
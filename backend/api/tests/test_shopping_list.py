@@ -0,0 +1,142 @@
+from api.tests.base import FoodgramTestCase
+from foodgram.models import (Ingredient, IngredientInRecipe, ShoppingCart,
+                             ShoppingListItem, UnitConversion)
+
+
+class ShoppingListTest(FoodgramTestCase):
+    """Готовый список покупок следует за корзиной при любом изменении."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = cls.users[2]
+        cls.first = cls.create_recipe(
+            cls.users[0], ingredients=cls.ingredients[:2], amount=2
+        )
+        cls.second = cls.create_recipe(
+            cls.users[1], ingredients=cls.ingredients[1:3], amount=3
+        )
+
+    def setUp(self):
+        self.client = self.client_for(self.user)
+        for recipe in (self.first, self.second):
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/', {'servings': 2}
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def items(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'amount'))
+
+    def assert_items(self, expected):
+        ingredients = self.ingredients
+        self.assertEqual(self.items(), {
+            ingredients[index].id: amount
+            for index, amount in expected.items()
+        })
+        ShoppingListItem.objects.rebuild(users=[self.user])
+        self.assertEqual(self.items(), {
+            ingredients[index].id: amount
+            for index, amount in expected.items()
+        })
+
+    def test_carts_are_added(self):
+        self.assert_items({0: 4, 1: 10, 2: 6})
+
+    def test_author_deletion_shrinks_list(self):
+        self.users[0].delete()
+        self.assert_items({1: 6, 2: 6})
+
+    def test_recipe_deletion_shrinks_list(self):
+        self.second.delete()
+        self.assert_items({0: 4, 1: 4})
+        self.first.delete()
+        self.assertEqual(self.items(), {})
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_direct_edits_are_applied(self):
+        # Так строки меняет админка: save() и delete() по одной.
+        cart = ShoppingCart.objects.get(user=self.user, recipe=self.first)
+        cart.servings = 1
+        cart.save()
+        row = IngredientInRecipe.objects.get(
+            recipe=self.second, ingredients=self.ingredients[2]
+        )
+        row.amount = 5
+        row.save()
+        IngredientInRecipe.objects.get(
+            recipe=self.second, ingredients=self.ingredients[1]
+        ).delete()
+        IngredientInRecipe.objects.create(
+            recipe=self.first, ingredients=self.ingredients[3], amount=1
+        )
+        self.assert_items({0: 2, 1: 2, 2: 10, 3: 1})
+
+    def test_ingredient_deletion_shrinks_list(self):
+        self.ingredients[1].delete()
+        self.assert_items({0: 4, 2: 6})
+
+    def test_bulk_changes_are_applied(self):
+        url = '/api/recipes/shopping_cart/'
+        response = self.client.delete(url, {'ids': [self.first.id]},
+                                      format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_items({1: 6, 2: 6})
+        response = self.client.post(
+            url, {'ids': [self.first.id], 'servings': 3}, format='json'
+        )
+        self.assertEqual(response.json()['added'], [self.first.id])
+        self.assert_items({0: 6, 1: 12, 2: 6})
+
+
+class ServingsTest(FoodgramTestCase):
+    """Порции умножают количества, единицы сводятся к базовой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = cls.users[0]
+        # Перевод кг в г есть в данных миграции.
+        UnitConversion.objects.get(unit='кг', base_unit='г', factor=1000)
+        flour = Ingredient.objects.create(name='Мука', measurement_unit='кг')
+        cls.recipe = cls.create_recipe(
+            cls.users[1], ingredients=[cls.ingredients[0], flour], amount=2
+        )
+        cls.other = cls.create_recipe(
+            cls.users[1], name='Другой', ingredients=[
+                Ingredient.objects.create(name='Мука', measurement_unit='г')
+            ], amount=300,
+        )
+
+    def setUp(self):
+        self.client = self.client_for(self.user)
+        self.url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+
+    def export(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().split('\n')
+
+    def test_servings_scale_amounts(self):
+        self.assertEqual(
+            self.client.post(self.url, {'servings': 3}).status_code, 201
+        )
+        self.assertEqual(self.export(),
+                         ['- Ингредиент 0 (г) - 6', '- Мука (г) - 6000'])
+        self.assertEqual(
+            self.client.patch(self.url, {'servings': 1}).status_code, 200
+        )
+        self.assertEqual(self.export(),
+                         ['- Ингредиент 0 (г) - 2', '- Мука (г) - 2000'])
+        self.assertEqual(
+            self.client.patch(self.url, {'servings': 0}).status_code, 400
+        )
+
+    def test_units_are_normalized(self):
+        self.client.post(self.url)
+        self.client.post(f'/api/recipes/{self.other.id}/shopping_cart/')
+        self.assertEqual(self.export(),
+                         ['- Ингредиент 0 (г) - 2', '- Мука (г) - 2300'])
@@ -0,0 +1,45 @@
+from django.core.cache import cache
+
+from api.tests.base import FoodgramTestCase
+from foodgram.models import Tag
+
+
+class SnapshotTest(FoodgramTestCase):
+    """Справочники отдаются из снимка с ETag до изменения таблицы."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for()
+
+    def assert_snapshot(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public, max-age=', response['Cache-Control'])
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, response.content)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            name = change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(name, [item['name'] for item in response.json()])
+
+    def test_tags(self):
+        def change():
+            Tag.objects.filter(pk=self.tags[0].pk).delete()
+            return Tag.objects.create(name='Новый', color='#ffffff',
+                                      slug='new').name
+
+        self.assert_snapshot('/api/tags/', change)
+
+    def test_ingredients(self):
+        def change():
+            ingredient = self.ingredients[0]
+            ingredient.name = 'Переименованный'
+            ingredient.save()
+            return ingredient.name
+
+        self.assert_snapshot('/api/ingredients/', change)
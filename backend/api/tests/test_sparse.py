@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import FoodgramTestCase
+
+
+class SparseFieldsTest(FoodgramTestCase):
+    """?fields= и ?expand= сужают ответ и запросы к БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.create_recipe(
+            cls.users[1], tags=cls.tags[:2], ingredients=cls.ingredients[:2],
+            amount=3,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.users[0])
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.sql = '\n'.join(query['sql'] for query in captured)
+        return response.json()
+
+    def test_users(self):
+        data = self.get('/api/users/?fields=id,username')
+        self.assertEqual(
+            [set(user) for user in data['results']],
+            [{'id', 'username'}] * len(self.users),
+        )
+        self.assertNotIn('users_follow', self.sql)
+        data = self.get(f'/api/users/{self.users[1].id}/'
+                        '?fields=id,is_subscribed')
+        self.assertEqual(data, {'id': self.users[1].id,
+                                'is_subscribed': False})
+        self.assertEqual(self.get('/api/users/me/?fields=email'),
+                         {'email': self.users[0].email})
+        self.assertEqual(
+            set(self.get('/api/users/me/')),
+            {'email', 'id', 'username', 'first_name', 'last_name',
+             'is_subscribed', 'recipes_count', 'followers_count'},
+        )
+
+    def test_recipes(self):
+        url = f'/api/recipes/{self.recipe.id}/?fields=id,author,ingredients'
+        data = self.get(url)
+        self.assertEqual(data, {
+            'id': self.recipe.id,
+            'author': self.users[1].id,
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 3}
+                for ingredient in self.ingredients[:2]
+            ],
+        })
+        self.assertNotIn('foodgram_tag', self.sql)
+        data = self.get(f'{url}&expand=author')
+        self.assertEqual(data['author']['username'], 'user1')
+        data = self.get('/api/recipes/?fields=name,tags')
+        self.assertEqual(data['results'], [{
+            'name': 'Рецепт', 'tags': [tag.id for tag in self.tags[:2]],
+        }])
+
+    def test_unknown_field(self):
+        for url in ('/api/users/?fields=password',
+                    '/api/recipes/?fields=id,secret'):
+            self.assertEqual(self.client.get(url).status_code, 400)
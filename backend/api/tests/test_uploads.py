@@ -0,0 +1,70 @@
+import tempfile
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from api.tests.base import FoodgramTestCase
+from foodgram.models import ImageUpload, Recipe
+
+
+class ImageUploadTest(FoodgramTestCase):
+    """Картинка загружается заранее, рецепт получает её по токену."""
+
+    url = '/api/recipes/images/'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=directory.name))
+        self.client = self.client_for(self.users[0])
+
+    @staticmethod
+    def png(name='photo.png'):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(),
+                                  content_type='image/png')
+
+    def upload(self, image, client=None):
+        return (client or self.client).post(
+            self.url, {'image': image}, format='multipart'
+        )
+
+    def create_recipe_with(self, token, client=None):
+        return (client or self.client).post('/api/recipes/', {
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image_token': token,
+        }, format='json')
+
+    def test_token_is_claimed_by_recipe(self):
+        response = self.upload(self.png())
+        self.assertEqual(response.status_code, 201)
+        token = response.json()['image_token']
+        upload = ImageUpload.objects.get(pk=token)
+
+        other = self.client_for(self.users[1])
+        self.assertEqual(
+            self.create_recipe_with(token, other).status_code, 400
+        )
+        response = self.create_recipe_with(token)
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.image.name, upload.image.name)
+        self.assertFalse(ImageUpload.objects.filter(pk=token).exists())
+        self.assertEqual(self.create_recipe_with(token).status_code, 400)
+
+    def test_rejected_uploads(self):
+        self.assertEqual(
+            self.upload(self.png(), self.client_for()).status_code, 401
+        )
+        not_image = SimpleUploadedFile('photo.png', b'<html>' * 10,
+                                       content_type='image/png')
+        self.assertEqual(self.upload(not_image).status_code, 400)
+        with self.settings(RECIPE_IMAGE_MAX_SIZE=16):
+            self.assertEqual(self.upload(self.png()).status_code, 413)
+        self.assertFalse(ImageUpload.objects.exists())
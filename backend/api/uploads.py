@@ -0,0 +1,60 @@
+"""Потоковая загрузка картинок рецептов multipart-запросом.
+
+Тело запроса пишется во временный файл по частям, размер и сигнатура
+файла проверяются по мере чтения, а не после загрузки целиком.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+# Сигнатуры форматов, которые принимает Pillow для картинок рецептов.
+SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n'),
+    (0, b'\xff\xd8\xff'),
+    (0, b'GIF87a'),
+    (0, b'GIF89a'),
+    (8, b'WEBP'),
+)
+SIGNATURE_LENGTH = 12
+# Запас на границы multipart и заголовки частей.
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой.'
+    default_code = 'payload_too_large'
+
+
+def max_image_size():
+    return settings.RECIPE_IMAGE_MAX_SIZE
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск и обрывает загрузку при превышении лимита."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > max_image_size() + MULTIPART_OVERHEAD:
+            raise PayloadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_image_size():
+            raise PayloadTooLarge()
+        if len(self.head) < SIGNATURE_LENGTH:
+            self.head += raw_data[:SIGNATURE_LENGTH]
+            if len(self.head) >= SIGNATURE_LENGTH and not any(
+                self.head[offset:offset + len(signature)] == signature
+                for offset, signature in SIGNATURES
+            ):
+                raise ValidationError(
+                    {'image': 'Загрузите PNG, JPEG, GIF или WebP.'}
+                )
+        return super().receive_data_chunk(raw_data, start)
@@ -1,24 +1,46 @@
+import hashlib
+import operator
+from functools import reduce
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import connection, transaction
+from django.db.models import (Count, Exists, F, Max, OuterRef, Prefetch, Q,
+                              Subquery, Sum, Value)
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, exceptions
+from rest_framework import mixins, status, exceptions
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.viewsets import (GenericViewSet, ModelViewSet,
+                                     ReadOnlyModelViewSet)
 
-from api.filters import RecipesFilter, IngredientFilter
-from api.pagination import CustomPagination
+from api.cache import (AUTHOR_USER_FIELDS, CATALOG_VERSION_KEY,
+                       author_version, get_recipe_detail, get_version,
+                       recipe_detail_key, set_recipe_detail)
+from api.exporters import EXPORTERS
+from api.filters import RECIPE_ORDERINGS, RecipesFilter, IngredientFilter
+from api.indexes import (ingredient_index, ingredient_snapshot, pantry_index,
+                         tag_snapshot)
+from api.pagination import CustomPagination, invalidate_counts
 from api.permissions import RecipePermission
+from api.sparse import SparseFieldsViewMixin
+from api.uploads import ImageUploadHandler
 from api.serializers import (
     TagSerializer,
     IngredientSerializer,
+    BulkRecipesSerializer,
     RecipeListSerializer,
     RecipeCreateSerializer,
     FavoriteSerializer,
+    ImageUploadSerializer,
     ShoppingCartSerializer,
 )
 from foodgram.models import (
@@ -28,33 +50,152 @@ from foodgram.models import (
     Favorite,
     ShoppingCart,
     IngredientInRecipe,
+    RecipeSearchTerm,
+    ShoppingListItem,
+    SimilarRecipe,
+    UnitConversion,
 )
+from foodgram.search import tokenize
+from users.models import Follow
 
 User = get_user_model()
 
+EXPORT_CHUNK_SIZE = 500
+SEARCH_MAX_TOKENS = 8
+
+
+class SnapshotListMixin:
+    """list отдаёт готовый снимок справочника с ETag и Cache-Control.
+
+    Снимок перестраивается только после изменения справочника, поэтому
+    ни полный ответ, ни 304 на If-None-Match не обращаются к БД.
+    """
+
+    snapshot = None
+
+    def list(self, request, *args, **kwargs):
+        snapshot = self.snapshot.get()
+        response = get_conditional_response(request, etag=snapshot['etag'])
+        if response is None:
+            response = HttpResponse(
+                snapshot['content'], content_type='application/json'
+            )
+        response['ETag'] = snapshot['etag']
+        response['Cache-Control'] = (
+            f'public, max-age={settings.REFERENCE_CACHE_MAX_AGE}'
+        )
+        return response
+
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(SnapshotListMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    snapshot = tag_snapshot
     # permission_classes = (IsAuthenticatedOrReadOnly,)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(SnapshotListMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (RecipePermission,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    snapshot = ingredient_snapshot
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по name отвечает из индекса в памяти, без запросов к БД."""
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        try:
+            limit = min(int(request.query_params['limit']), limit)
+        except (KeyError, ValueError):
+            pass
+        return Response(ingredient_index.search(name, max(limit, 1)))
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin, GenericViewSet):
+    """Загрузка картинки до создания рецепта, без base64 в JSON."""
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
 
-class RecipeViewSet(ModelViewSet):
-    queryset = Recipe.objects.all()
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class RecipeViewSet(SparseFieldsViewMixin, ModelViewSet):
     permission_classes = (RecipePermission,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
+    sparse_actions = ('list', 'retrieve', 'search', 'similar',
+                      'recommended', 'pantry')
+
+    @property
+    def keyset_ordering(self):
+        return RECIPE_ORDERINGS.get(
+            self.request.query_params.get('ordering'), ('-pub_date', '-id')
+        )
+
+    def get_queryset(self):
+        """Рецепты с prefetch связей и флагами текущего юзера.
+
+        Страница любого размера сериализуется фиксированным числом
+        запросов: рецепты, теги, ингредиенты и (для авторизованного)
+        авторы с флагом подписки. Запросы для полей, не выбранных
+        через ?fields=, не выполняются.
+        """
+        user = self.request.user
+        queryset = Recipe.objects.all()
+        deferred = [
+            field for field, name in (('text', 'text'),
+                                      ('image_renditions', 'images'))
+            if not self.wants(name)
+        ]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        if self.wants('tags'):
+            queryset = queryset.prefetch_related('tags')
+        if self.wants('ingredients', expanded=True):
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingredient',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredients'
+                )
+            ))
+        elif self.wants('ingredients'):
+            queryset = queryset.prefetch_related('ingredient')
+        if not user.is_authenticated:
+            if self.wants('author', expanded=True):
+                queryset = queryset.select_related('author')
+            return queryset
+        if self.wants('author', expanded=True):
+            queryset = queryset.prefetch_related(Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=Exists(Follow.objects.filter(
+                        user=user, author=OuterRef('pk')
+                    ))
+                )
+            ))
+        flags = {
+            'is_favorited': Favorite,
+            'is_in_shopping_cart': ShoppingCart,
+        }
+        return queryset.annotate(**{
+            name: Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+            for name, model in flags.items() if self.wants(name)
+        })
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -86,19 +227,212 @@ class RecipeViewSet(ModelViewSet):
             headers=headers
         )
 
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт из общего кэша с наложением флагов текущего юзера.
+
+        Общая часть (теги, автор, ингредиенты, картинка) кэшируется по
+        версии рецепта; флаги избранного, корзины и подписки и счётчики
+        читаются одним запросом по первичному ключу. Ответ с ?fields= строится
+        мимо кэша, запросами только для выбранных полей.
+        """
+        if self.sparse_fields[0] is not None:
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            recipe_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise exceptions.NotFound()
+        key = recipe_detail_key(recipe_id, request.get_host())
+        data = get_recipe_detail(key)
+        if data is None:
+            author_id = Recipe.objects.filter(pk=recipe_id).values_list(
+                'author_id', flat=True
+            ).first()
+            if author_id is None:
+                raise exceptions.NotFound()
+            version = author_version(author_id)
+            data = self.get_serializer(self.get_object()).data
+            set_recipe_detail(key, data, version)
+            return Response(data)
+
+        user = request.user
+        flags = {}
+        if user.is_authenticated:
+            flags = {
+                'is_favorited': Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                'is_subscribed': Exists(Follow.objects.filter(
+                    user=user, author=OuterRef('author')
+                )),
+            }
+        overlay = Recipe.objects.filter(pk=recipe_id).values(
+            'favorites_count',
+            'carts_count',
+            recipes_count=F('author__recipes_count'),
+            followers_count=F('author__followers_count'),
+            **flags,
+        ).first()
+        if overlay is None:
+            raise exceptions.NotFound()
+        overlay = {
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'is_subscribed': False,
+            **overlay,
+        }
+        for field in AUTHOR_USER_FIELDS:
+            data['author'][field] = overlay.pop(field)
+        data.update(overlay)
+        return Response(data)
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'search', 'similar',
+                           'recommended', 'pantry'):
             return RecipeListSerializer
         return RecipeCreateSerializer
 
+    @staticmethod
+    def term_lookup(token):
+        """Префиксный поиск терма, использующий индекс на любой СУБД."""
+        if connection.vendor == 'postgresql':
+            return Q(term__startswith=token)
+        return Q(term__gte=token, term__lt=token + '\uffff')
+
+    @action(detail=False, methods=('GET',))
+    def search(self, request):
+        """Поиск по названию, описанию и ингредиентам рецептов.
+
+        Рецепт должен содержать все слова запроса (последнее может быть
+        началом слова); результаты упорядочены по сумме весов термов.
+        Ранг считается подзапросом, чтобы join фильтра по тегам не
+        умножал веса.
+        """
+        tokens = list(dict.fromkeys(tokenize(request.query_params.get(
+            'q', ''
+        ))))[:SEARCH_MAX_TOKENS]
+        if not tokens:
+            raise ValidationError({'q': 'Введите поисковый запрос.'})
+        lookups = [self.term_lookup(token) for token in tokens]
+        queryset = self.filter_queryset(self.get_queryset())
+        for lookup in lookups:
+            queryset = queryset.filter(
+                id__in=RecipeSearchTerm.objects.filter(lookup).values(
+                    'recipe'
+                )
+            )
+        queryset = queryset.annotate(search_rank=Subquery(
+            RecipeSearchTerm.objects.filter(
+                reduce(operator.or_, lookups), recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                rank=Sum('weight')
+            ).values('rank')
+        )).order_by('-search_rank', '-pub_date')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=('GET',))
+    def similar(self, request, pk=None):
+        """Похожие рецепты из top-k, посчитанного командой rebuild_similar."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        similar_ids = list(SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).order_by('-score').values_list('similar_id', flat=True))
+        recipes = self.get_queryset().in_bulk(similar_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in similar_ids if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=('GET',),
+            permission_classes=(IsAuthenticated,))
+    def recommended(self, request):
+        """Рецепты, похожие на избранное юзера.
+
+        Пока избранного нет, отдаются набирающие популярность рецепты.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if Favorite.objects.filter(user=request.user).exists():
+            queryset = SimilarRecipe.objects.recommended(
+                queryset, request.user
+            )
+        else:
+            queryset = queryset.exclude(author=request.user).order_by(
+                *RECIPE_ORDERINGS['trending']
+            )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def ingredient_ids(request, name):
+        """Список id из ?name=1,2&name=3."""
+        try:
+            return [
+                int(value)
+                for values in request.query_params.getlist(name)
+                for value in values.split(',') if value.strip()
+            ]
+        except ValueError:
+            raise ValidationError({name: 'Передайте id ингредиентов.'})
+
+    @action(detail=False, methods=('GET',))
+    def pantry(self, request):
+        """Что приготовить из имеющихся ингредиентов.
+
+        ?ingredients= — что есть, ?include= — что обязательно должно
+        быть в рецепте, ?exclude= — чего быть не должно. Рецепты
+        ранжируются по доле покрытых ингредиентов и числу недостающих.
+        """
+        available = self.ingredient_ids(request, 'ingredients')
+        include = self.ingredient_ids(request, 'include')
+        if not available and not include:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'}
+            )
+        limit = settings.PANTRY_SEARCH_LIMIT
+        try:
+            limit = max(min(int(request.query_params['limit']), limit), 1)
+        except (KeyError, ValueError):
+            pass
+        ranked = pantry_index.search(
+            available, include, self.ingredient_ids(request, 'exclude'),
+            limit,
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in ranked]
+        )
+        data = []
+        for recipe_id, coverage, missing in ranked:
+            if recipe_id in recipes:
+                item = self.get_serializer(recipes[recipe_id]).data
+                item['coverage'] = round(coverage, 4)
+                item['missing'] = missing
+                data.append(item)
+        return Response(data)
+
+    def recipe_data(self, recipe):
+        """Рецепт для ответа, перечитанный через get_queryset.
+
+        Связи берутся из prefetch, а флаги — уже после изменения.
+        """
+        return RecipeListSerializer(
+            self.get_queryset().get(pk=recipe.pk),
+            context=self.get_serializer_context(),
+        ).data
+
+    @transaction.atomic
     def favorite_logic(self, user, recipe):
+        Favorite.objects.lock_user(user)
         serializer = FavoriteSerializer(
             data={'user': user.id, 'recipe': recipe.id}
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        favorite_serializer = RecipeListSerializer(recipe)
-        return favorite_serializer.data
+        return self.recipe_data(recipe)
 
     @action(detail=True, methods=('POST', 'DELETE'))
     def favorite(self, request, pk=None):
@@ -110,25 +444,35 @@ class RecipeViewSet(ModelViewSet):
                 favorite_data,
                 status=status.HTTP_201_CREATED
             )
-        favorite = Favorite.objects.filter(user=user, recipe=recipe)
-        if not favorite:
-            raise exceptions.ValidationError(
-                'The recipe is not in list of favorites'
-            )
-        favorite.delete()
+        with transaction.atomic():
+            Favorite.objects.lock_user(user)
+            favorite = Favorite.objects.filter(user=user, recipe=recipe)
+            if not favorite:
+                raise exceptions.ValidationError(
+                    'The recipe is not in list of favorites'
+                )
+            favorite.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @transaction.atomic
     def shopping_cart_logic(self, user, recipe):
-        serializer = ShoppingCartSerializer(
-            data={'user': user.id, 'recipe': recipe.id}
-        )
+        ShoppingCart.objects.lock_user(user)
+        serializer = ShoppingCartSerializer(data={
+            'user': user.id,
+            'recipe': recipe.id,
+            'servings': self.request.data.get('servings', 1),
+        })
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        shopping_cart_serializer = RecipeListSerializer(recipe)
-        return shopping_cart_serializer.data
+        return self.recipe_data(recipe)
 
-    @action(detail=True, methods=('POST', 'DELETE'))
+    @action(detail=True, methods=('POST', 'PATCH', 'DELETE'))
     def shopping_cart(self, request, pk=None):
+        """Добавление рецепта в корзину, смена числа порций, удаление.
+
+        POST принимает servings — число порций (по умолчанию 1),
+        PATCH меняет его; список покупок пересчитывается на разницу.
+        """
         user = self.request.user
         recipe = get_object_or_404(Recipe, pk=pk)
         if self.request.method == 'POST':
@@ -137,43 +481,136 @@ class RecipeViewSet(ModelViewSet):
                 shopping_cart_data,
                 status=status.HTTP_201_CREATED
             )
-        shopping_cart = ShoppingCart.objects.filter(user=user, recipe=recipe)
-        if not shopping_cart:
-            raise exceptions.ValidationError(
-                'Нет рецепта.'
-            )
-        shopping_cart.delete()
+        with transaction.atomic():
+            ShoppingCart.objects.lock_user(user)
+            cart = ShoppingCart.objects.select_for_update().filter(
+                user=user, recipe=recipe
+            ).first()
+            if cart is None:
+                raise exceptions.ValidationError(
+                    'Нет рецепта.'
+                )
+            if self.request.method == 'PATCH':
+                serializer = ShoppingCartSerializer(
+                    cart,
+                    data={'servings': request.data.get('servings')},
+                    partial=True,
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                return Response(self.recipe_data(recipe))
+            cart.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @transaction.atomic
+    def bulk_change(self, request, model):
+        """Добавляет или удаляет пачку рецептов одним запросом к таблице.
+
+        Ответ — только id по исходам, без сериализации рецептов.
+        """
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        if request.method == 'POST':
+            fields = {}
+            if model is ShoppingCart:
+                fields['servings'] = serializer.validated_data['servings']
+            added, existing, not_found = model.objects.add_many(
+                user, ids, **fields
+            )
+            changed = bool(added)
+            result = {
+                'added': added,
+                'exists': existing,
+                'not_found': not_found,
+            }
+        else:
+            rows = model.objects.remove_many(user, ids)
+            removed = {row.recipe_id for row in rows}
+            changed = bool(removed)
+            result = {
+                'removed': [pk for pk in ids if pk in removed],
+                'not_found': [pk for pk in ids if pk not in removed],
+            }
+        if changed:
+            invalidate_counts()
+        return Response(result)
+
+    @action(detail=False, methods=('POST', 'DELETE'),
+            url_path='favorite', permission_classes=(IsAuthenticated,))
+    def favorite_bulk(self, request):
+        """Массовое добавление и удаление избранного: {"ids": [...]}."""
+        return self.bulk_change(request, Favorite)
+
+    @action(detail=False, methods=('POST', 'DELETE'),
+            url_path='shopping_cart', permission_classes=(IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        """Массовое добавление и удаление корзины: {"ids": [...]}.
+
+        POST принимает servings — число порций для всех рецептов пачки.
+        """
+        return self.bulk_change(request, ShoppingCart)
+
     @action(
         detail=False,
         methods=('GET',),
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_cart_items = ShoppingCart.objects.filter(user=user)
+        """Потоковая выгрузка списка покупок.
 
-        if not shopping_cart_items.exists():
+        Формат задаётся параметром type (txt, csv, json). ETag строится
+        по состоянию списка, поэтому повторная загрузка неизменного
+        списка отдаёт 304 без чтения строк.
+        """
+        user = request.user
+        exporter_class = EXPORTERS.get(request.query_params.get('type', 'txt'))
+        if exporter_class is None:
+            raise ValidationError(
+                {'type': f'Доступные форматы: {", ".join(EXPORTERS)}.'}
+            )
+        items = ShoppingListItem.objects.filter(user=user)
+        state = items.aggregate(count=Count('id'), updated=Max('updated'))
+        if not state['count']:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__in=shopping_cart_items.values('recipe')
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-
-        shopping_list = [
-            (f'- {ingredient["ingredient__name"]} '
-             f'({ingredient["ingredient__measurement_unit"]}) - '
-             f'{ingredient["amount"]}')
-            for ingredient in ingredients
-        ]
-        shopping_list = '\n'.join(shopping_list)
+        etag = quote_etag(hashlib.md5(
+            f'{user.id}:{state["count"]}:{state["updated"].isoformat()}:'
+            f'{get_version(CATALOG_VERSION_KEY)}:'
+            f'{exporter_class.extension}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
 
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        # Единицы переводятся в базовые в том же запросе: одинаковые
+        # ингредиенты в г и кг складываются в одну строку.
+        conversion = UnitConversion.objects.filter(
+            unit=OuterRef('ingredient__measurement_unit')
+        )
+        ingredients = items.annotate(
+            factor=Coalesce(
+                Subquery(conversion.values('factor')[:1]), Value(1.0)
+            ),
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=Coalesce(
+                Subquery(conversion.values('base_unit')[:1]),
+                F('ingredient__measurement_unit'),
+            ),
+        ).annotate(
+            total=Sum(F('amount') * F('factor')),
+        ).order_by('name', 'measurement_unit').iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        )
+        filename = (f'{user.username}_shopping_list.'
+                    f'{exporter_class.extension}')
+        response = StreamingHttpResponse(
+            exporter_class().stream(ingredients),
+            content_type=exporter_class.content_type,
+        )
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
         return response
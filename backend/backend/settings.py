@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,19 +68,48 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    # 'default': {
-    #     'ENGINE': 'django.db.backends.postgresql',
-    #     'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
-    #     'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
-    #     'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-    #     'HOST': os.getenv('DB_HOST', 'db'),
-    #     'PORT': os.getenv('DB_PORT', 5432)
-    # }
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+# Соединение переживает запрос и переиспользуется воркером;
+# 0 — новое соединение на каждый запрос.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
+            'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'db'),
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # Перед повторным использованием проверяется, живо ли оно.
+            'CONN_HEALTH_CHECKS': True,
+            # За pgbouncer в режиме transaction серверные курсоры
+            # iterator() теряются между транзакциями.
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('DB_PGBOUNCER', 'False') == 'True'
+            ),
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', os.path.join(BASE_DIR,
+                                                          'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+
+# PRAGMA для каждого нового соединения SQLite (foodgram.signals).
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
 }
 
 
@@ -138,6 +168,65 @@ REST_FRAMEWORK = {
     ),
 }
 
+PAGINATION_COUNT_TTL = int(os.getenv('PAGINATION_COUNT_TTL', 60))
+PAGINATION_ESTIMATED_COUNT = (
+    os.getenv('PAGINATION_ESTIMATED_COUNT', 'False') == 'True'
+)
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', 10000)
+)
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+TAG_SNAPSHOT_TTL = int(os.getenv('TAG_SNAPSHOT_TTL', 60 * 60))
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', 60 * 60))
+PANTRY_INDEX_TTL = int(os.getenv('PANTRY_INDEX_TTL', 600))
+PANTRY_SEARCH_LIMIT = int(os.getenv('PANTRY_SEARCH_LIMIT', 50))
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', 100))
+
+TRENDING_HALF_LIFE = float(os.getenv('TRENDING_HALF_LIFE', 24))
+SIMILAR_RECIPES_TOP_K = int(os.getenv('SIMILAR_RECIPES_TOP_K', 10))
+SIMILAR_RECIPES_MAX_POSTING = int(
+    os.getenv('SIMILAR_RECIPES_MAX_POSTING', 1000)
+)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_TTL = int(os.getenv('IMAGE_UPLOAD_TTL', 24 * 60 * 60))
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+# Кроме персонала, /metrics доступен только с этих адресов (через запятую).
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',')
+    if ip.strip()
+]
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 20))
+# Ключ — имя вью или 'МЕТОД имя вью'; остальным вью — QUERY_BUDGET_DEFAULT.
+QUERY_BUDGETS = {
+    'tags-list': 2,
+    'ingredients-list': 2,
+    'recipes-list': 8,
+    'recipes-detail': 6,
+    'recipes-search': 8,
+    'recipes-similar': 6,
+    'recipes-recommended': 8,
+    'recipes-pantry': 8,
+    'recipes-download-shopping-cart': 3,
+    'users-list': 4,
+    'users-detail': 4,
+    'users-me': 3,
+    'subscriptions-list': 5,
+    'POST recipes-list': 40,
+    'PUT recipes-detail': 40,
+    'PATCH recipes-detail': 40,
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
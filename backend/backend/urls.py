@@ -16,7 +16,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from api.profiling import metrics
+
 urlpatterns = [
+    path('metrics', metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
@@ -5,14 +5,17 @@ from foodgram.models import (
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    RecipeSearchTerm,
     ShoppingCart,
-    Tag
+    Tag,
+    UnitConversion,
 )
 from foodgram.forms import (
     RecipeForm,
     IngredientForm,
     IngredientInRecipeFormSet
 )
+from users.models import FeedItem
 
 
 @admin.register(Tag)
@@ -47,20 +50,23 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'author',
         'text',
-        'count_favorites',
+        'favorites_count',
+        'carts_count',
     )
-    readonly_fields = ('count_favorites',)
+    readonly_fields = ('favorites_count', 'carts_count')
     search_fields = ('author', 'name',)
     list_filter = ('author', 'name',)
 
-    @admin.display(description='Число добавлений в избранное')
-    def count_favorites(self, obj):
-        return obj.favorite_set.count()
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if not change:
+            FeedItem.objects.fan_out(form.instance)
+        RecipeSearchTerm.objects.reindex([form.instance])
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe',)
+    list_display = ('user', 'recipe', 'servings',)
     search_fields = ('user', 'recipe',)
     list_filter = ('user', 'recipe',)
     empty_value_display = '-пусто-'
@@ -80,3 +86,9 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     search_fields = ('recipe', 'ingredients',)
     list_filter = ('recipe', 'ingredients',)
     empty_value_display = '-пусто-'
+
+
+@admin.register(UnitConversion)
+class UnitConversionAdmin(admin.ModelAdmin):
+    list_display = ('unit', 'base_unit', 'factor',)
+    search_fields = ('unit', 'base_unit',)
@@ -0,0 +1,358 @@
+"""Синтетические данные production-размера для замеров.
+
+Популярность ингредиентов, авторов и рецептов и активность юзеров
+распределены по закону Ципфа: немногие встречаются очень часто,
+большинство — редко. Строки генерируются блоками фиксированного
+размера, и у каждого блока свой генератор случайных чисел от seed,
+поэтому результат не зависит от числа процессов. Первичные ключи юзеров
+и рецептов назначаются заранее, чтобы блоки не ждали друг друга, а
+число подписок, избранного и корзин каждого юзера распределяется до
+генерации, так что пары не повторяются и итог совпадает с заданным.
+"""
+import math
+import multiprocessing
+import random
+from datetime import timedelta
+from heapq import nlargest
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+CHUNK_SIZE = 10000
+USERS_PER_CHUNK = 500
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+DISHES = ('салат', 'суп', 'запеканка', 'пирог', 'рагу', 'паста', 'омлет',
+          'каша', 'соус', 'десерт')
+PASSWORD = 'fixture'
+RECIPES_PERIOD = timedelta(days=365)
+EVENTS_PERIOD = timedelta(days=90)
+
+
+class Zipf:
+    """Выбор из population с весом 1 / rank ** exponent.
+
+    Ранги раздаются в случайном порядке, поэтому популярные элементы не
+    совпадают с первыми id.
+    """
+
+    def __init__(self, population, exponent, rng):
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.weights = [
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ]
+        self.cum_weights = list(accumulate(self.weights))
+
+    def choices(self, rng, k):
+        return rng.choices(self.population, cum_weights=self.cum_weights,
+                           k=k)
+
+    def sample(self, rng, k):
+        """k разных элементов.
+
+        Небольшая выборка добирается повторными choices; большая, где
+        пришлось бы долго ждать редких элементов, делается ключами
+        log(u) / weight (Efraimidis–Spirakis).
+        """
+        k = min(k, len(self.population))
+        if k * 4 > len(self.population):
+            return [item for _, item in nlargest(k, (
+                (math.log(1 - rng.random()) / weight, item)
+                for item, weight in zip(self.population, self.weights)
+            ))]
+        found = {}
+        while len(found) < k:
+            found.update(dict.fromkeys(self.choices(rng, k - len(found))))
+        return list(found)
+
+    def allocate(self, total, cap):
+        """Делит total по весам, не больше cap на элемент."""
+        counts = [0] * len(self.weights)
+        total = min(total, cap * len(counts))
+        active = range(len(counts))
+        while sum(counts) < total:
+            remaining = total - sum(counts)
+            weight_sum = sum(self.weights[index] for index in active)
+            shares = {
+                index: remaining * self.weights[index] / weight_sum
+                for index in active
+            }
+            for index, share in shares.items():
+                counts[index] += int(share)
+            leftover = total - sum(counts)
+            for index in sorted(
+                active, key=lambda index: int(shares[index]) - shares[index]
+            )[:leftover]:
+                counts[index] += 1
+            for index in active:
+                counts[index] = min(counts[index], cap)
+            active = [index for index in active if counts[index] < cap]
+        return counts
+
+
+class FixtureGenerator:
+    """Юзеры, рецепты, подписки, избранное и корзины заданного объёма."""
+
+    def __init__(self, users, recipes, follows, favorites, carts,
+                 ingredients_per_recipe=(3, 12), exponent=1.1, seed=0,
+                 batch_size=1000):
+        self.counts = {
+            'users': users,
+            'recipes': recipes,
+            'follows': follows,
+            'favorites': favorites,
+            'carts': carts,
+        }
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.exponent = exponent
+        self.seed = seed
+        self.batch_size = batch_size
+
+    def rng(self, *key):
+        return random.Random(':'.join(map(str, (self.seed, *key))))
+
+    def prepare(self):
+        """Справочники и диапазоны id, общие для всех блоков."""
+        ingredients = dict(Ingredient.objects.values_list('id', 'name'))
+        if not ingredients:
+            raise ValueError('Справочник ингредиентов пуст.')
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            )
+        self.ingredient_names = ingredients
+        self.tag_ids = list(
+            Tag.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.user_base = (
+            User.objects.aggregate(last=Max('id'))['last'] or 0
+        ) + 1
+        self.recipe_base = (
+            Recipe.objects.aggregate(last=Max('id'))['last'] or 0
+        ) + 1
+        self.user_ids = range(
+            self.user_base, self.user_base + self.counts['users']
+        )
+        self.recipe_ids = range(
+            self.recipe_base, self.recipe_base + self.counts['recipes']
+        )
+        self.password = make_password(PASSWORD)
+        self.now = timezone.now()
+        self.ingredients = Zipf(sorted(ingredients), self.exponent,
+                                self.rng('ingredients'))
+        self.authors = Zipf(self.user_ids, self.exponent, self.rng('authors'))
+        self.active_users = Zipf(self.user_ids, self.exponent,
+                                 self.rng('active-users'))
+        self.popular_recipes = Zipf(self.recipe_ids, self.exponent,
+                                    self.rng('popular-recipes'))
+        # Сколько строк каждого вида у юзера: самые активные получают
+        # больше, но не больше, чем есть авторов или рецептов.
+        self.activity = {
+            kind: self.active_users.allocate(self.counts[kind], cap)
+            for kind, cap in (
+                ('follows', max(self.counts['users'] - 1, 0)),
+                ('favorites', self.counts['recipes']),
+                ('carts', self.counts['recipes']),
+            )
+        }
+
+    def tasks(self, kind):
+        if kind in self.activity:
+            users = self.counts['users']
+            return [
+                (kind, index, start, min(start + USERS_PER_CHUNK, users))
+                for index, start in enumerate(
+                    range(0, users, USERS_PER_CHUNK)
+                )
+            ]
+        total = self.counts[kind]
+        return [
+            (kind, index, start, min(start + CHUNK_SIZE, total))
+            for index, start in enumerate(range(0, total, CHUNK_SIZE))
+        ]
+
+    def run(self, workers=1, log=None):
+        """Создаёт строки по фазам; блоки одной фазы независимы."""
+        self.prepare()
+        for phase in (('users',), ('recipes',),
+                      ('follows', 'favorites', 'carts')):
+            tasks = [task for kind in phase for task in self.tasks(kind)]
+            if workers > 1 and len(tasks) > 1:
+                connections.close_all()
+                global _generator
+                _generator = self
+                context = multiprocessing.get_context('fork')
+                with context.Pool(workers) as pool:
+                    for _ in pool.imap_unordered(run_chunk, tasks):
+                        pass
+            else:
+                for task in tasks:
+                    self.run_chunk(*task)
+            if log:
+                log(f'{", ".join(phase)}: готово')
+        self.reset_sequences()
+
+    def run_chunk(self, kind, index, start, stop):
+        rng = self.rng(kind, index)
+        with transaction.atomic():
+            getattr(self, f'create_{kind}')(rng, start, stop)
+
+    def reset_sequences(self):
+        """После явных id счётчики PostgreSQL нужно сдвинуть вручную."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def create_users(self, rng, start, stop):
+        users = []
+        for index in range(start, stop):
+            user_id = self.user_base + index
+            users.append(User(
+                id=user_id,
+                username=f'fixture{user_id}',
+                email=f'fixture{user_id}@example.com',
+                first_name=f'Имя{user_id}',
+                last_name=f'Фамилия{user_id}',
+                password=self.password,
+            ))
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+
+    def create_recipes(self, rng, start, stop):
+        step = RECIPES_PERIOD / max(self.counts['recipes'], 1)
+        first_date = self.now - RECIPES_PERIOD
+        recipes = []
+        amounts = []
+        tags = []
+        low, high = self.ingredients_per_recipe
+        for index in range(start, stop):
+            recipe_id = self.recipe_base + index
+            ingredient_ids = self.ingredients.sample(
+                rng, rng.randint(low, high)
+            )
+            names = [self.ingredient_names[pk] for pk in ingredient_ids]
+            recipes.append(Recipe(
+                id=recipe_id,
+                author_id=self.authors.choices(rng, 1)[0],
+                name=f'{names[0]} {rng.choice(DISHES)}'[:100],
+                text='Понадобится: ' + ', '.join(names) + '.',
+                image='recipes/fixture.png',
+                cooking_time=max(1, min(
+                    int(rng.lognormvariate(3.3, 0.6)), 600
+                )),
+                pub_date=first_date + step * (index + rng.random()),
+            ))
+            amounts.extend(
+                IngredientInRecipe(
+                    recipe_id=recipe_id,
+                    ingredients_id=ingredient_id,
+                    amount=rng.choice((1, 2, 5, 10, 50, 100, 200, 500)),
+                )
+                for ingredient_id in ingredient_ids
+            )
+            tags.extend(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in rng.sample(
+                    self.tag_ids, min(rng.randint(1, 2), len(self.tag_ids))
+                )
+            )
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        IngredientInRecipe.objects.bulk_create(
+            amounts, batch_size=self.batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            tags, batch_size=self.batch_size
+        )
+
+    def pairs(self, rng, kind, start, stop, targets):
+        """Пары (юзер, цель) для юзеров блока, без повторов.
+
+        start и stop — позиции юзеров в порядке активности.
+        """
+        for position in range(start, stop):
+            user_id = self.active_users.population[position]
+            count = self.activity[kind][position]
+            if not count:
+                continue
+            if kind == 'follows':
+                chosen = [
+                    author_id
+                    for author_id in targets.sample(rng, count + 1)
+                    if author_id != user_id
+                ][:count]
+            else:
+                chosen = targets.sample(rng, count)
+            for target in chosen:
+                yield user_id, target
+
+    def event_date(self, rng):
+        return self.now - EVENTS_PERIOD * rng.random()
+
+    def create_follows(self, rng, start, stop):
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in self.pairs(
+                    rng, 'follows', start, stop, self.authors
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def create_favorites(self, rng, start, stop):
+        Favorite.objects.bulk_create(
+            (
+                Favorite(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    add_date=self.event_date(rng),
+                )
+                for user_id, recipe_id in self.pairs(
+                    rng, 'favorites', start, stop, self.popular_recipes
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def create_carts(self, rng, start, stop):
+        ShoppingCart.objects.bulk_create(
+            (
+                ShoppingCart(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    add_date=self.event_date(rng),
+                    servings=rng.choice((1, 1, 2, 2, 3, 4)),
+                )
+                for user_id, recipe_id in self.pairs(
+                    rng, 'carts', start, stop, self.popular_recipes
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+
+
+_generator = None
+
+
+def run_chunk(task):
+    """Точка входа процесса пула: генератор наследуется через fork."""
+    _generator.run_chunk(*task)
@@ -0,0 +1,127 @@
+"""Уменьшенные копии картинок рецептов.
+
+Для каждой картинки строятся копии нескольких размеров в WebP и JPEG.
+Пути копий зависят только от имени исходного файла и размера, поэтому
+повторная обработка перезаписывает те же файлы. Обработка идёт в пуле
+потоков после коммита транзакции, а не во время запроса.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Наибольшая сторона копии в пикселях.
+RENDITIONS = {
+    'small': 320,
+    'medium': 640,
+    'large': 1280,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+RENDITIONS_DIR = 'recipes/renditions'
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+    thread_name_prefix='renditions',
+)
+
+
+def rendition_path(source, size, extension):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f'{RENDITIONS_DIR}/{stem}_{size}.{extension}'
+
+
+def save_image(image, path, image_format, options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def render(source):
+    """Строит копии картинки source и возвращает их описание."""
+    with default_storage.open(source) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    renditions = {}
+    for size, side in RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail((side, side), Image.LANCZOS)
+        rendition = {'width': image.width, 'height': image.height}
+        for extension, (image_format, options) in FORMATS.items():
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                flat = Image.new('RGB', image.size, 'white')
+                flat.paste(image, mask=image.getchannel('A'))
+                image_to_save = flat
+            else:
+                image_to_save = image
+            rendition[extension] = save_image(
+                image_to_save,
+                rendition_path(source, size, extension),
+                image_format,
+                options,
+            )
+        renditions[size] = rendition
+    return {'source': source, 'sizes': renditions}
+
+
+def generate_renditions(recipe_id):
+    """Строит копии для рецепта, если его картинка не поменялась."""
+    from foodgram.models import Recipe
+
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).first()
+        if recipe is None or not recipe.image:
+            return
+        source = recipe.image.name
+        renditions = render(source)
+        previous = recipe.image_renditions
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().filter(
+                pk=recipe_id, image=source
+            ).first()
+            if recipe is None:
+                return
+            recipe.image_renditions = renditions
+            recipe.save(update_fields=('image_renditions',))
+        if previous.get('source') not in (None, source):
+            delete_renditions(previous)
+    except Exception:
+        logger.exception('Не удалось обработать картинку рецепта %s',
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def delete_renditions(renditions):
+    for rendition in renditions.get('sizes', {}).values():
+        for extension in FORMATS:
+            if rendition.get(extension):
+                default_storage.delete(rendition[extension])
+
+
+def needs_renditions(recipe):
+    return bool(recipe.image) and (
+        recipe.image_renditions.get('source') != recipe.image.name
+    )
+
+
+def schedule_renditions(recipe):
+    """Ставит обработку картинки в пул после коммита транзакции."""
+    transaction.on_commit(
+        partial(executor.submit, generate_renditions, recipe.pk)
+    )
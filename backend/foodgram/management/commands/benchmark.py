@@ -0,0 +1,301 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+}
+
+
+def percentile(values, percent):
+    """Перцентиль с линейной интерполяцией."""
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and measure latency and '
+            'queries of the API hot paths')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--favorites', type=int, default=4000)
+        parser.add_argument('--carts', type=int, default=1000)
+        parser.add_argument('--zipf', type=float, default=1.1)
+        parser.add_argument(
+            '--ingredients-file',
+            default=str(Path(settings.BASE_DIR).parent / 'data'
+                        / 'ingredients.csv'),
+        )
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Замеряемых запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Сценарий; можно несколько. По умолчанию все.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один замеряемый запрос.')
+        scenarios = options['scenarios'] or list(self.scenarios())
+        unknown = set(scenarios) - set(self.scenarios())
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}.'
+            )
+        self.random = random.Random(options['seed'])
+        if options['users'] < 2 or not options['recipes']:
+            raise CommandError('Нужны хотя бы два юзера и один рецепт.')
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        if (connection.vendor == 'sqlite'
+                and not connection.settings_dict['TEST']['NAME']):
+            # В памяти WAL и synchronous ни на что не влияют.
+            connection.settings_dict['TEST']['NAME'] = (
+                f'{old_name}.benchmark'
+            )
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            # Свой LocMem: cache.clear() и ключи recipe-detail:<host>:<id>
+            # не задевают кэш, общий с работающим приложением.
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                cache.clear()
+                started = time.perf_counter()
+                dataset = self.seed(options)
+                seed_time = time.perf_counter() - started
+                database = self.database()
+                results = {
+                    name: self.run(name, options) for name in scenarios
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'commit': self.commit(),
+                'created': timezone.now().isoformat(),
+                'django': django.get_version(),
+                'database': database,
+                'seed': options['seed'],
+                'seed_seconds': round(seed_time, 2),
+                'dataset': dataset,
+            },
+            'results': results,
+        }
+        self.print_table(results)
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps(report, ensure_ascii=False, indent=2)
+            )
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def database():
+        """Настройки соединения, от которых зависят замеры."""
+        settings_dict = connection.settings_dict
+        config = {
+            'vendor': connection.vendor,
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'conn_health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+            'server_side_cursors': not settings_dict.get(
+                'DISABLE_SERVER_SIDE_CURSORS', False
+            ),
+        }
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for name in settings.SQLITE_PRAGMAS:
+                    cursor.execute(f'PRAGMA {name}')
+                    config[name] = cursor.fetchone()[0]
+        return config
+
+    def seed(self, options):
+        """Данные generate_fixtures и токены для всех юзеров."""
+        call_command(
+            'generate_fixtures',
+            users=options['users'],
+            recipes=options['recipes'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            carts=options['carts'],
+            zipf=options['zipf'],
+            seed=options['seed'],
+            ingredients_file=options['ingredients_file'],
+            stdout=StringIO(),
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+        self.tokens = {
+            token.user_id: token.key
+            for token in Token.objects.bulk_create(
+                (Token(user_id=user_id, key=Token.generate_key())
+                 for user_id in user_ids),
+                batch_size=BATCH_SIZE,
+            )
+        }
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)
+        )
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.cart_users = list(ShoppingCart.objects.values_list(
+            'user_id', flat=True
+        ).distinct())
+        return {
+            'users': len(user_ids),
+            'recipes': len(self.recipe_ids),
+            'ingredients': len(self.ingredient_names),
+            'ingredients_in_recipes': IngredientInRecipe.objects.count(),
+            'follows': Follow.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'carts': ShoppingCart.objects.count(),
+            'zipf': options['zipf'],
+        }
+
+    def scenarios(self):
+        """Сценарий: (нужен ли юзер с корзиной или любой, или аноним, URL).
+
+        URL сценария с записью — пара (URL, тело POST-запроса).
+        """
+        return {
+            'recipes-list': (None, lambda: '/api/recipes/?limit=6'),
+            'recipes-list-auth': ('any', lambda: '/api/recipes/?limit=6'),
+            'recipes-filtered': ('any', lambda: (
+                f'/api/recipes/?limit=6&is_favorited=1'
+                f'&tags={self.random.choice(self.tag_slugs)}'
+            )),
+            'recipes-popular': (None, lambda: (
+                '/api/recipes/?limit=6&ordering=popular'
+            )),
+            'recipes-detail': ('any', lambda: (
+                f'/api/recipes/{self.random.choice(self.recipe_ids)}/'
+            )),
+            'subscriptions': ('any', lambda: (
+                '/api/users/subscriptions/?recipes_limit=3'
+            )),
+            'ingredient-search': (None, lambda: (
+                '/api/ingredients/?name='
+                + self.random.choice(self.ingredient_names)[:3]
+            )),
+            'download-shopping-cart': ('cart', lambda: (
+                '/api/recipes/download_shopping_cart/?type=txt'
+            )),
+            'favorite-bulk': ('any', lambda: ('/api/recipes/favorite/', {
+                'ids': self.random.sample(
+                    self.recipe_ids, min(5, len(self.recipe_ids))
+                ),
+            })),
+        }
+
+    def client(self, who):
+        client = APIClient()
+        if who is not None:
+            users = self.cart_users if who == 'cart' else list(self.tokens)
+            client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[
+                self.random.choice(users)
+            ])
+        return client
+
+    def run(self, name, options):
+        who, url = self.scenarios()[name]
+        latencies = []
+        queries = []
+        sizes = []
+        for index in range(options['warmup'] + options['requests']):
+            client = self.client(who)
+            path = url()
+            # Соединение открывается на входе в CaptureQueriesContext,
+            # поэтому время подключения входит в замер.
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                if isinstance(path, tuple):
+                    path, data = path
+                    response = client.post(path, data, format='json')
+                else:
+                    response = client.get(path)
+                content = (b''.join(response.streaming_content)
+                           if response.streaming else response.content)
+            # Как в конце запроса под gunicorn: при CONN_MAX_AGE=0
+            # следующий запрос откроет соединение заново.
+            close_old_connections()
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{name}: {path} ответил {response.status_code}'
+                )
+            if index >= options['warmup']:
+                latencies.append(elapsed)
+                queries.append(len(captured))
+                sizes.append(len(content))
+        return {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'throughput_rps': round(len(latencies) / sum(latencies), 1),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'bytes_mean': round(statistics.fmean(sizes)),
+        }
+
+    def print_table(self, results):
+        columns = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps',
+                   'queries_mean', 'bytes_mean')
+        self.stdout.write(
+            f'{"scenario":<24}' + ''.join(f'{name:>16}' for name in columns)
+        )
+        for name, result in results.items():
+            self.stdout.write(f'{name:<24}' + ''.join(
+                f'{result[column]:>16}' for column in columns
+            ))
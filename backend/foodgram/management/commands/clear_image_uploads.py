@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodgram.models import ImageUpload
+
+
+class Command(BaseCommand):
+    help = 'Delete image uploads that were never attached to a recipe'
+
+    def handle(self, *args, **options):
+        expired = ImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(
+                seconds=settings.IMAGE_UPLOAD_TTL
+            )
+        )
+        count = 0
+        for upload in expired.iterator():
+            upload.image.delete(save=False)
+            upload.delete()
+            count += 1
+        self.stdout.write(f'Удалено неиспользованных картинок: {count}')
@@ -0,0 +1,97 @@
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.fixtures import FixtureGenerator
+from foodgram.models import Ingredient
+
+DERIVED_COMMANDS = (
+    ('reconcile_counters',),
+    ('rebuild_search_index',),
+    ('rebuild_shopping_lists',),
+    ('rebuild_feed',),
+    ('update_trending', '--full'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Generate large synthetic users, recipes, follows, favorites '
+            'and carts with Zipf-skewed popularity')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument('--favorites', type=int, default=1000000)
+        parser.add_argument('--carts', type=int, default=200000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа; больше — сильнее перекос.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Процессов для вставки; на SQLite запись всё равно '
+                 'последовательна.',
+        )
+        parser.add_argument(
+            '--ingredients-file',
+            default=str(Path(settings.BASE_DIR).parent / 'data'
+                        / 'ingredients.csv'),
+            help='Справочник, загружаемый, если ингредиентов в БД нет.',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, поиск, списки покупок, '
+                 'ленты и рейтинг.',
+        )
+
+    def handle(self, *args, **options):
+        if options['follows'] and options['users'] < 2:
+            raise CommandError('Для подписок нужно хотя бы два юзера.')
+        if ((options['favorites'] or options['carts'])
+                and not options['recipes']):
+            raise CommandError('Для избранного и корзин нужны рецепты.')
+        if (options['recipes'] or options['follows']) and not options['users']:
+            raise CommandError('Для рецептов и подписок нужны юзеры.')
+        if not Ingredient.objects.exists():
+            call_command(
+                'load_data', options['ingredients_file'],
+                '--catalog', 'ingredients', stdout=StringIO(),
+            )
+        low, high = options['ingredients_per_recipe']
+        if not 1 <= low <= high:
+            raise CommandError('Неверный диапазон ингредиентов в рецепте.')
+
+        generator = FixtureGenerator(
+            users=options['users'],
+            recipes=options['recipes'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            carts=options['carts'],
+            ingredients_per_recipe=(low, high),
+            exponent=options['zipf'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        started = time.perf_counter()
+        generator.run(workers=options['workers'], log=self.stdout.write)
+        self.stdout.write(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с'
+        )
+        if not options['skip_derived']:
+            for command in DERIVED_COMMANDS:
+                started = time.perf_counter()
+                call_command(*command, stdout=StringIO())
+                self.stdout.write(
+                    f'{command[0]}: {time.perf_counter() - started:.1f} с'
+                )
@@ -1,38 +1,199 @@
-import os
+import csv
 import json
+import os
+from itertools import islice
+
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import CATALOG_VERSION_KEY
+from api.signals import (bump_on_commit, invalidate_ingredient_index,
+                         invalidate_tag_snapshot)
 from foodgram.models import Ingredient, Tag
 
+# Натуральный ключ, по которому строка файла сопоставляется с записью
+# в БД, поля, которые обновляются у найденной записи, и действия
+# после импорта (bulk-операции не отправляют сигналы моделей).
+CATALOGS = {
+    'ingredients': {
+        'model': Ingredient,
+        'key': ('name', 'measurement_unit'),
+        'update': (),
+        'invalidate': invalidate_ingredient_index,
+    },
+    'tags': {
+        'model': Tag,
+        'key': ('slug',),
+        'update': ('name', 'color'),
+        'invalidate': invalidate_tag_snapshot,
+    },
+}
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file, fields):
+    reader = csv.reader(file)
+    for row in reader:
+        if not row or tuple(row) == fields:
+            continue
+        yield dict(zip(fields, row))
+
+
+def read_jsonl(file, fields):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
 
-def read_ingredients():
-    with open(os.path.join(settings.BASE_DIR, 'data', 'ingredients.json'),
-              'r', encoding='utf-8') as f:
-        data = json.load(f)
-        for i in range(len(data)):
-            Ingredient.objects.get_or_create(
-                name=data[i].get("name"),
-                measurement_unit=data[i].get("measurement_unit")
-            )
-    print('Данные из файла ingredients.json загружены')
+def read_json(file, fields):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Файл JSON оборван или повреждён.')
+            return
 
 
-def read_tags():
-    with open(os.path.join(settings.BASE_DIR, 'data', 'tags.json'),
-              'r', encoding='utf-8') as f:
-        data = json.load(f)
-        for i in range(len(data)):
-            Tag.objects.get_or_create(
-                name=data[i].get("name"),
-                slug=data[i].get("slug"),
-                color=data[i].get("color")
-            )
-    print('Данные из файла tags.json загружены')
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
 
 
 class Command(BaseCommand):
+    help = ('Stream ingredients or tags from CSV/JSON/JSONL files and '
+            'upsert them in batches by natural key')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='*',
+            help='Файлы для импорта. По умолчанию data/ingredients.json '
+                 'и data/tags.json.',
+        )
+        parser.add_argument(
+            '--catalog', choices=CATALOGS,
+            help='Справочник; по умолчанию определяется по имени файла.',
+        )
+        parser.add_argument(
+            '--format', dest='file_format', choices=READERS,
+            help='Формат; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Посчитать изменения и откатить их.',
+        )
 
     def handle(self, *args, **options):
-        read_ingredients()
-        read_tags()
+        files = options['files'] or self.default_files()
+        for path in files:
+            self.import_file(path, options)
+        if options['dry_run']:
+            self.stdout.write('Dry run: изменения отменены.')
+
+    def default_files(self):
+        for directory in (settings.BASE_DIR / 'data',
+                          settings.BASE_DIR.parent / 'data'):
+            files = [
+                directory / name
+                for name in ('ingredients.json', 'tags.json')
+                if (directory / name).exists()
+            ]
+            if files:
+                return files
+        raise CommandError('Не найдены файлы ingredients.json и tags.json')
+
+    def import_file(self, path, options):
+        name, extension = os.path.splitext(os.path.basename(path))
+        catalog_name = options['catalog'] or name
+        file_format = options['file_format'] or extension.lstrip('.')
+        if catalog_name not in CATALOGS:
+            raise CommandError(f'{path}: укажите --catalog.')
+        if file_format not in READERS:
+            raise CommandError(f'{path}: укажите --format.')
+        catalog = CATALOGS[catalog_name]
+        model = catalog['model']
+        fields = catalog['key'] + catalog['update']
+
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = READERS[file_format](file, fields)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                # Каждая пачка — своя транзакция: импорт не держит
+                # блокировки до конца файла, а сбой откатывает только
+                # текущую пачку.
+                with transaction.atomic():
+                    if self.upsert(catalog, batch, counts):
+                        catalog['invalidate']()
+                        bump_on_commit(CATALOG_VERSION_KEY)
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'{path} -> {model._meta.verbose_name_plural}: '
+            f'добавлено {counts["inserted"]}, '
+            f'обновлено {counts["updated"]}, '
+            f'без изменений {counts["unchanged"]}'
+        )
+
+    def upsert(self, catalog, batch, counts):
+        """Вставляет и обновляет пачку; True, если что-то изменилось."""
+        model = catalog['model']
+        key_fields = catalog['key']
+        update_fields = catalog['update']
+        incoming = {}
+        for row in batch:
+            try:
+                values = {
+                    field: str(row[field]).strip()
+                    for field in key_fields + update_fields
+                }
+            except KeyError as error:
+                raise CommandError(f'Нет поля {error} в строке {row}')
+            incoming[tuple(values[field] for field in key_fields)] = values
+
+        existing = {
+            tuple(getattr(obj, field) for field in key_fields): obj
+            for obj in model.objects.filter(**{
+                f'{key_fields[0]}__in': {key[0] for key in incoming}
+            })
+        }
+        created, changed = [], []
+        for key, values in incoming.items():
+            obj = existing.get(key)
+            if obj is None:
+                created.append(model(**values))
+            elif any(getattr(obj, field) != values[field]
+                     for field in update_fields):
+                for field in update_fields:
+                    setattr(obj, field, values[field])
+                changed.append(obj)
+        model.objects.bulk_create(created)
+        if changed:
+            model.objects.bulk_update(changed, update_fields)
+        counts['inserted'] += len(created)
+        counts['updated'] += len(changed)
+        counts['unchanged'] += len(incoming) - len(created) - len(changed)
+        return bool(created or changed)
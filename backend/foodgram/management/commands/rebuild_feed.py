@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild subscription feeds from follows and recipes'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedItem.objects.rebuild()
+        self.stdout.write(
+            f'Ленты подписок пересчитаны: {FeedItem.objects.count()} записей'
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import executor, generate_renditions, needs_renditions
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG renditions of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии и для уже обработанных картинок.',
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = [
+            recipe.id
+            for recipe in Recipe.objects.only('id', 'image',
+                                              'image_renditions')
+            if options['force'] or needs_renditions(recipe)
+        ]
+        for _ in executor.map(generate_renditions, recipe_ids):
+            pass
+        self.stdout.write(
+            f'Копии картинок построены: {len(recipe_ids)} рецептов'
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.models import Recipe, RecipeSearchTerm
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the recipe full-text search index'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            with transaction.atomic():
+                RecipeSearchTerm.objects.reindex(Recipe.objects.filter(
+                    id__in=recipe_ids[start:start + BATCH_SIZE]
+                ))
+        self.stdout.write(
+            f'Поисковый индекс пересчитан: {len(recipe_ids)} рецептов'
+        )
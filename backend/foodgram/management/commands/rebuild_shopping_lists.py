@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized shopping lists from shopping carts'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ShoppingListItem.objects.rebuild()
+        self.stdout.write(
+            f'Списки покупок пересчитаны: '
+            f'{ShoppingListItem.objects.count()} позиций'
+        )
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodgram.models import SimilarRecipe
+
+
+class Command(BaseCommand):
+    help = 'Recompute top-k similar recipes for changed recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты, а не только изменённые.',
+        )
+
+    def handle(self, *args, **options):
+        count = SimilarRecipe.objects.rebuild(
+            k=settings.SIMILAR_RECIPES_TOP_K,
+            max_posting=settings.SIMILAR_RECIPES_MAX_POSTING,
+            full=options['full'],
+        )
+        self.stdout.write(f'Похожие рецепты пересчитаны: {count} рецептов')
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from foodgram.models import Favorite, Recipe, ShoppingCart, count_rows
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in denormalized favorite, cart and follower counters'
+
+    def handle(self, *args, **options):
+        counters = (
+            (Recipe, 'favorites_count', count_rows(Favorite, 'recipe')),
+            (Recipe, 'carts_count', count_rows(ShoppingCart, 'recipe')),
+            (User, 'recipes_count', count_rows(Recipe, 'author')),
+            (User, 'followers_count', count_rows(Follow, 'author')),
+        )
+        for model, field, actual in counters:
+            with transaction.atomic():
+                drifted = model.objects.annotate(actual=actual).exclude(
+                    **{field: F('actual')}
+                ).values_list('pk', flat=True)
+                fixed = model.objects.filter(pk__in=list(drifted)).update(
+                    **{field: actual}
+                )
+            self.stdout.write(
+                f'{model._meta.label}.{field}: исправлено {fixed}'
+            )
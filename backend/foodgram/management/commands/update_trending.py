@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.models import Favorite, Recipe, ShoppingCart, TrendingWatermark
+from foodgram.trending import WEIGHTS, event_score, logaddexp
+
+WATERMARK_ID = 1
+BATCH_SIZE = 500
+# События моложе этого могут принадлежать ещё не закоммиченным
+# транзакциям; они войдут в следующий запуск.
+COMMIT_LAG = timedelta(seconds=30)
+
+
+def collect_scores(until, since=None, recipe_ids=None, exclude=()):
+    """Сумма вкладов событий из (since, until] по рецептам."""
+    scores = defaultdict(lambda: None)
+    for model, weight in ((Favorite, WEIGHTS['favorite']),
+                          (ShoppingCart, WEIGHTS['cart'])):
+        events = model.objects.filter(add_date__lte=until)
+        if since is not None:
+            events = events.filter(add_date__gt=since)
+        if recipe_ids is not None:
+            events = events.filter(recipe_id__in=recipe_ids)
+        if exclude:
+            events = events.exclude(recipe_id__in=exclude)
+        for recipe_id, add_date in events.values_list(
+            'recipe_id', 'add_date'
+        ).order_by().iterator():
+            scores[recipe_id] = logaddexp(
+                scores[recipe_id], event_score(add_date, weight)
+            )
+    return scores
+
+
+class Command(BaseCommand):
+    help = ('Fold favorites and cart additions made since the last run '
+            'into recipe trending scores; recipes that lost a favorite '
+            'or cart entry are recomputed from scratch')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать с нуля, например после смены '
+                 'TRENDING_HALF_LIFE.',
+        )
+
+    def take_stale(self):
+        """Снимает флаг trending_stale и возвращает id рецептов.
+
+        Флаг снимается до чтения событий: удаление, случившееся во
+        время расчёта, снова поставит его к следующему запуску.
+        """
+        with transaction.atomic():
+            stale_ids = set(Recipe.objects.select_for_update().filter(
+                trending_stale=True
+            ).values_list('id', flat=True))
+            Recipe.objects.filter(id__in=stale_ids).update(
+                trending_stale=False
+            )
+        return stale_ids
+
+    def handle(self, *args, **options):
+        until = timezone.now() - COMMIT_LAG
+        since = None if options['full'] else (
+            TrendingWatermark.objects.filter(pk=WATERMARK_ID).values_list(
+                'until', flat=True
+            ).first()
+        )
+        stale_ids = set() if since is None else self.take_stale()
+        try:
+            self.update(until, since, stale_ids)
+        except BaseException:
+            Recipe.objects.filter(id__in=stale_ids).update(
+                trending_stale=True
+            )
+            raise
+
+    def update(self, until, since, stale_ids):
+        scores = collect_scores(until, since, exclude=stale_ids)
+        rebuilt = collect_scores(until, recipe_ids=stale_ids)
+
+        recipe_ids = list(set(scores) | stale_ids)
+        with transaction.atomic():
+            if since is None:
+                Recipe.objects.update(trending_score=0, trending_stale=False)
+            for start in range(0, len(recipe_ids), BATCH_SIZE):
+                recipes = list(Recipe.objects.filter(
+                    id__in=recipe_ids[start:start + BATCH_SIZE]
+                ).only('id', 'trending_score'))
+                for recipe in recipes:
+                    if recipe.id in stale_ids:
+                        recipe.trending_score = rebuilt[recipe.id] or 0
+                    else:
+                        recipe.trending_score = logaddexp(
+                            recipe.trending_score or None, scores[recipe.id]
+                        )
+                Recipe.objects.bulk_update(recipes, ('trending_score',))
+            TrendingWatermark.objects.update_or_create(
+                pk=WATERMARK_ID, defaults={'until': until}
+            )
+        self.stdout.write(
+            f'Рейтинг обновлён: {len(recipe_ids)} рецептов'
+            + ('' if since is not None else ' (полный пересчёт)')
+        )
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_shopping_lists(apps, schema_editor):
+    IngredientInRecipe = apps.get_model('foodgram', 'IngredientInRecipe')
+    ShoppingListItem = apps.get_model('foodgram', 'ShoppingListItem')
+    totals = IngredientInRecipe.objects.filter(
+        recipe__cart__isnull=False
+    ).values('recipe__cart__user', 'ingredients').annotate(
+        total=models.Sum('amount')
+    ).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row['recipe__cart__user'],
+                ingredient_id=row['ingredients'],
+                amount=row['total'],
+            )
+            for row in totals
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodgram.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списка покупок',
+                'ordering': ('ingredient__name',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
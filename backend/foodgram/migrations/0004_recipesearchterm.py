@@ -0,0 +1,58 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from foodgram.search import recipe_terms
+
+
+def fill_search_terms(apps, schema_editor):
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    IngredientInRecipe = apps.get_model('foodgram', 'IngredientInRecipe')
+    RecipeSearchTerm = apps.get_model('foodgram', 'RecipeSearchTerm')
+    ingredient_names = {}
+    for recipe_id, name in IngredientInRecipe.objects.values_list(
+        'recipe_id', 'ingredients__name'
+    ):
+        ingredient_names.setdefault(recipe_id, []).append(name)
+    RecipeSearchTerm.objects.bulk_create(
+        (
+            RecipeSearchTerm(recipe_id=recipe_id, term=term, weight=weight)
+            for recipe_id, name, text in Recipe.objects.values_list(
+                'id', 'name', 'text'
+            ).iterator()
+            for term, weight in recipe_terms(
+                name, text, ingredient_names.get(recipe_id, ())
+            ).items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Терм')),
+                ('weight', models.PositiveIntegerField(verbose_name='Вес')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='foodgram.recipe')),
+            ],
+            options={
+                'verbose_name': 'Поисковый терм',
+                'verbose_name_plural': 'Поисковые термы',
+                'indexes': [models.Index(fields=['term'], name='recipe_search_term_prefix', opclasses=('varchar_pattern_ops',))],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'recipe'), name='unique_recipe_search_term'),
+        ),
+        migrations.RunPython(fill_search_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0006_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('image', models.ImageField(upload_to='recipes/', verbose_name='Картинка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Загруженная картинка',
+                'verbose_name_plural': 'Загруженные картинки',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
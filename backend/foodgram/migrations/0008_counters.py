@@ -0,0 +1,38 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+# Снимок на момент миграции: count_rows из foodgram.models может
+# измениться вместе с моделями.
+FILL_COUNTERS = """
+UPDATE foodgram_recipe SET
+    favorites_count = (
+        SELECT COUNT(*) FROM foodgram_favorite
+        WHERE foodgram_favorite.recipe_id = foodgram_recipe.id
+    ),
+    carts_count = (
+        SELECT COUNT(*) FROM foodgram_shoppingcart
+        WHERE foodgram_shoppingcart.recipe_id = foodgram_recipe.id
+    )
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0007_imageupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число добавлений в корзину'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.RunSQL(FILL_COUNTERS, migrations.RunSQL.noop),
+    ]
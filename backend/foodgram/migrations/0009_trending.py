@@ -0,0 +1,32 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг набирающих популярность'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='add_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата добавления в корзину'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popular'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending'),
+        ),
+    ]
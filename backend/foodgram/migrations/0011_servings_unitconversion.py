@@ -0,0 +1,54 @@
+# Generated by Django 4.2.6 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+# Единицы из data/ingredients.csv, которые переводятся друг в друга.
+# Остальные (шт., по вкусу, пучок...) остаются как есть.
+UNITS = (
+    ('г', 'г', 1),
+    ('кг', 'г', 1000),
+    ('мл', 'мл', 1),
+    ('л', 'мл', 1000),
+    ('стакан', 'мл', 200),
+    ('ст. л.', 'мл', 15),
+    ('ч. л.', 'мл', 5),
+    ('капля', 'мл', 0.05),
+)
+
+
+def seed_units(apps, schema_editor):
+    UnitConversion = apps.get_model('foodgram', 'UnitConversion')
+    UnitConversion.objects.bulk_create(
+        UnitConversion(unit=unit, base_unit=base_unit, factor=factor)
+        for unit, base_unit, factor in UNITS
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0010_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=200, unique=True, verbose_name='Единица измерения')),
+                ('base_unit', models.CharField(max_length=200, verbose_name='Базовая единица')),
+                ('factor', models.FloatField(verbose_name='Множитель')),
+            ],
+            options={
+                'verbose_name': 'Перевод единиц',
+                'verbose_name_plural': 'Переводы единиц',
+                'ordering': ('unit',),
+            },
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Число порций'),
+        ),
+        migrations.RunPython(seed_units, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:40
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+MAX_AMOUNT = 32767
+
+
+def merge_duplicates(apps, schema_editor):
+    """Один ингредиент в рецепте — одна строка с суммой количеств."""
+    IngredientInRecipe = apps.get_model('foodgram', 'IngredientInRecipe')
+    duplicates = IngredientInRecipe.objects.values(
+        'recipe', 'ingredients'
+    ).annotate(
+        rows=Count('id'), first=Min('id'), total=Sum('amount')
+    ).filter(rows__gt=1).order_by()
+    for row in duplicates:
+        IngredientInRecipe.objects.filter(id=row['first']).update(
+            amount=min(row['total'], MAX_AMOUNT)
+        )
+        IngredientInRecipe.objects.filter(
+            recipe=row['recipe'], ingredients=row['ingredients']
+        ).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0011_servings_unitconversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0013_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_stale',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Рейтинг нужно пересчитать'),
+        ),
+        migrations.CreateModel(
+            name='TrendingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('until', models.DateTimeField(verbose_name='События учтены до')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчёта рейтинга',
+                'verbose_name_plural': 'Отметки пересчёта рейтинга',
+            },
+        ),
+    ]
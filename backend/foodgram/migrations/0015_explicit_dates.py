@@ -0,0 +1,24 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0014_trending_watermark'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favorite',
+            name='add_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления в избранное'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата публикации'),
+        ),
+    ]
@@ -1,5 +1,15 @@
+import uuid
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (Case, Count, F, OuterRef, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from foodgram.recommendations import SimilarityModel
+from foodgram.search import recipe_terms
 
 User = get_user_model()
 
@@ -46,8 +56,35 @@ class Ingredient(models.Model):
         return f'{self.name} {self.measurement_unit}'
 
 
+class UnitConversion(models.Model):
+    """Перевод единицы измерения в базовую: 1 unit = factor base_unit."""
+    unit = models.CharField(
+        max_length=200,
+        unique=True,
+        verbose_name='Единица измерения',
+    )
+    base_unit = models.CharField(
+        max_length=200,
+        verbose_name='Базовая единица',
+    )
+    factor = models.FloatField(verbose_name='Множитель')
+
+    class Meta:
+        verbose_name = 'Перевод единиц'
+        verbose_name_plural = 'Переводы единиц'
+        ordering = ('unit',)
+
+    def __str__(self):
+        return f'1 {self.unit} = {self.factor:g} {self.base_unit}'
+
+
 class Recipe(models.Model):
-    tag = models.ManyToManyField(
+    DENORMALIZED_FIELDS = (
+        'favorites_count', 'carts_count', 'trending_score', 'trending_stale',
+        'similar_stale',
+    )
+
+    tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
     )
@@ -57,6 +94,7 @@ class Recipe(models.Model):
         on_delete=models.CASCADE,
         null=True,
         related_name='recipes',
+        db_index=False,  # Покрыт индексом recipe_author_pub_date.
     )
     name = models.CharField(verbose_name='Название рецепта', max_length=100)
     image = models.ImageField(
@@ -64,6 +102,12 @@ class Recipe(models.Model):
         verbose_name='Картинка',
         help_text='Загрузить картинку',
     )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -75,23 +119,79 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField()
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
-        auto_now_add=True,
+        # Не auto_now_add: генератор фикстур пишет свои даты в INSERT.
+        default=timezone.now,
+        editable=False,
+    )
+    favorites_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в избранное',
+    )
+    carts_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в корзину',
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг набирающих популярность',
+    )
+    trending_stale = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Рейтинг нужно пересчитать',
+    )
+    similar_stale = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Похожие рецепты нужно пересчитать',
     )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular',
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'),
+                name='recipe_trending',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Денормализованные поля меняются только через update()."""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         related_name='ingredient',
         on_delete=models.CASCADE,
+        db_index=False,  # Покрыт unique_recipe_ingredient.
     )
     ingredients = models.ForeignKey(
         Ingredient,
@@ -106,8 +206,16 @@ class IngredientInRecipe(models.Model):
         verbose_name_plural = 'Ингредиенты в рецепте'
         constraints = (
             models.UniqueConstraint(
+                fields=('recipe', 'ingredients'),
+                name='unique_recipe_ingredient'
+            ),
+        )
+        indexes = (
+            # Покрывающий: количества ингредиентов рецепта для списков
+            # покупок читаются из индекса, без обращения к таблице.
+            models.Index(
                 fields=('recipe', 'ingredients', 'amount'),
-                name='unique_recipe'
+                name='ingredient_in_recipe_amount',
             ),
         )
 
@@ -115,14 +223,114 @@ class IngredientInRecipe(models.Model):
         return f'{self.amount} {self.ingredients}'
 
 
+class UserRecipeManager(models.Manager):
+    """Массовое добавление и удаление рецептов юзера.
+
+    bulk_create не отправляет сигналы, поэтому счётчик рецептов
+    обновляется здесь же, одним UPDATE на всю пачку; удаление проходит
+    через сигналы. Методы вызываются в транзакции: они блокируют строку
+    юзера.
+    """
+
+    counter_field = None
+
+    def added(self, recipe_ids):
+        update_counter(
+            Recipe.objects.filter(id__in=recipe_ids), self.counter_field, 1
+        )
+
+    def lock_user(self, user):
+        """Сериализует изменения списка одного юзера до конца транзакции.
+
+        Иначе параллельные запросы видят одни и те же «новые» рецепты,
+        INSERT с ignore_conflicts вставляет их один раз, а счётчик
+        растёт в каждом запросе.
+        """
+        list(User.objects.select_for_update().filter(
+            pk=user.pk
+        ).values_list('pk', flat=True))
+
+    def add_many(self, user, recipe_ids, **fields):
+        """Добавляет рецепты одним INSERT.
+
+        Возвращает (добавленные, уже бывшие у юзера, несуществующие) id.
+        """
+        self.lock_user(user)
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', flat=True))
+        existing = set(self.filter(
+            user=user, recipe_id__in=found
+        ).values_list('recipe_id', flat=True))
+        added = [
+            recipe_id for recipe_id in recipe_ids
+            if recipe_id in found and recipe_id not in existing
+        ]
+        self.bulk_create(
+            [self.model(user=user, recipe_id=recipe_id, **fields)
+             for recipe_id in added],
+            ignore_conflicts=True,
+        )
+        self.added(added)
+        return (
+            added,
+            [recipe_id for recipe_id in recipe_ids if recipe_id in existing],
+            [recipe_id for recipe_id in recipe_ids if recipe_id not in found],
+        )
+
+    def remove_many(self, user, recipe_ids):
+        """Удаляет рецепты и возвращает удалённые строки.
+
+        Счётчики, рейтинг и списки покупок обновляют сигналы удаления.
+        """
+        self.lock_user(user)
+        rows = list(self.filter(user=user, recipe_id__in=recipe_ids))
+        if rows:
+            self.filter(pk__in=[row.pk for row in rows]).delete()
+        return rows
+
+
+class FavoriteManager(UserRecipeManager):
+    counter_field = 'favorites_count'
+
+    def added(self, recipe_ids):
+        super().added(recipe_ids)
+        Recipe.objects.filter(id__in=recipe_ids).update(similar_stale=True)
+
+
+class ShoppingCartManager(UserRecipeManager):
+    counter_field = 'carts_count'
+
+    def add_many(self, user, recipe_ids, servings=1):
+        added, existing, not_found = super().add_many(
+            user, recipe_ids, servings=servings
+        )
+        ShoppingListItem.objects.apply_carts(
+            user.id, dict.fromkeys(added, servings)
+        )
+        return added, existing, not_found
+
+
 class Favorite(models.Model):
-    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='favorites',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='favorites',
+        db_index=False,  # Покрыт unique_favorite_recipe.
+    )
     add_date = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='Дата добавления в избранное',
     )
 
+    objects = FavoriteManager()
+
     class Meta:
         ordering = ('-add_date',)
         verbose_name = 'Избранное'
@@ -133,6 +341,9 @@ class Favorite(models.Model):
                 name='unique_favorite_recipe'
             ),
         )
+        indexes = (
+            models.Index(fields=('add_date',), name='favorite_add_date'),
+        )
 
     def __str__(self):
         return f'{self.recipe} (Автор: {self.user})'
@@ -142,13 +353,24 @@ class ShoppingCart(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        related_name='cart',
+        related_name='shopping_cart',
     )
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='cart',
+        related_name='shopping_cart',
+        db_index=False,  # Покрыт unique_cart_list_recipe.
     )
+    add_date = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата добавления в корзину',
+    )
+    servings = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name='Число порций',
+    )
+
+    objects = ShoppingCartManager()
 
     class Meta:
         ordering = ('recipe',)
@@ -160,6 +382,392 @@ class ShoppingCart(models.Model):
                 name='unique_cart_list_recipe'
             ),
         )
+        indexes = (
+            models.Index(fields=('add_date',), name='cart_add_date'),
+        )
 
     def __str__(self):
         return f'{self.recipe} (Автор: {self.user})'
+
+
+def update_counter(queryset, field, delta):
+    """Меняет счётчик на delta одним UPDATE, без гонки чтения-записи."""
+    if delta:
+        queryset.update(**{field: F(field) + delta})
+
+
+def count_rows(model, field):
+    """Подзапрос: число строк model, ссылающихся на строку через field."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def recipe_amounts(recipe, servings=1):
+    """Количество каждого ингредиента рецепта: {ingredient_id: amount}."""
+    return {
+        ingredient_id: amount * servings
+        for ingredient_id, amount in IngredientInRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('ingredients_id', 'amount')
+    }
+
+
+def scale(amounts, factor):
+    return {key: value * factor for key, value in amounts.items()}
+
+
+class ShoppingListManager(models.Manager):
+    """Инкрементальное обновление готового списка покупок.
+
+    Строки ShoppingCart и IngredientInRecipe переносятся в списки
+    сигналами (api.signals); bulk_create их не отправляет, поэтому после
+    него вызывающий код применяет изменения сам.
+    """
+
+    def apply(self, user_ids, deltas):
+        """Прибавляет deltas {ingredient_id: amount} к спискам юзеров."""
+        deltas = {key: value for key, value in deltas.items() if value}
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, amount in deltas.items()
+                if amount > 0
+            ],
+            ignore_conflicts=True,
+        )
+        items = self.filter(user_id__in=user_ids)
+        items.filter(ingredient_id__in=deltas).update(
+            amount=F('amount') + Case(
+                *(When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in deltas.items()),
+                default=Value(0),
+            ),
+            updated=timezone.now(),
+        )
+        items.filter(amount__lte=0).delete()
+
+    def apply_carts(self, user_id, servings):
+        """Прибавляет рецепты {recipe_id: servings} к списку юзера.
+
+        Отрицательное число порций убирает рецепт из списка.
+        """
+        deltas = defaultdict(int)
+        rows = IngredientInRecipe.objects.filter(
+            recipe_id__in=servings
+        ).values_list('recipe_id', 'ingredients_id', 'amount')
+        for recipe_id, ingredient_id, amount in rows:
+            deltas[ingredient_id] += amount * servings[recipe_id]
+        self.apply([user_id], deltas)
+
+    def apply_to_carts(self, recipe, deltas):
+        """Прибавляет deltas на порцию ко всем корзинам с рецептом."""
+        carts = defaultdict(list)
+        for user_id, servings in ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', 'servings'):
+            carts[servings].append(user_id)
+        for servings, user_ids in carts.items():
+            self.apply(user_ids, scale(deltas, servings))
+
+    def rebuild(self, users=None):
+        """Пересчитывает списки с нуля по ShoppingCart."""
+        carts = ShoppingCart.objects.all()
+        items = self.all()
+        if users is not None:
+            carts = carts.filter(user__in=users)
+            items = items.filter(user__in=users)
+        totals = IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__in=carts
+        ).values(
+            'recipe__shopping_cart__user', 'ingredients'
+        ).annotate(
+            total=Sum(F('amount') * F('recipe__shopping_cart__servings'))
+        )
+        items.delete()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=row['recipe__shopping_cart__user'],
+                    ingredient_id=row['ingredients'],
+                    amount=row['total'],
+                )
+                for row in totals.order_by()
+            ),
+            batch_size=1000,
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок юзера.
+
+    Пересчитывается при изменении корзины и рецептов в ней, поэтому
+    скачивание списка читает только эту таблицу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    amount = models.IntegerField(default=0, verbose_name='Количество')
+    updated = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения',
+    )
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        ordering = ('ingredient__name',)
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} ({self.user})'
+
+
+class RecipeSearchTermManager(models.Manager):
+    """Поддержание обратного индекса для полнотекстового поиска."""
+
+    def reindex(self, recipes):
+        recipes = list(recipes)
+        ingredient_names = {}
+        for recipe_id, name in IngredientInRecipe.objects.filter(
+            recipe__in=recipes
+        ).values_list('recipe_id', 'ingredients__name'):
+            ingredient_names.setdefault(recipe_id, []).append(name)
+        self.filter(recipe__in=recipes).delete()
+        self.bulk_create(
+            (
+                self.model(recipe=recipe, term=term, weight=weight)
+                for recipe in recipes
+                for term, weight in recipe_terms(
+                    recipe.name,
+                    recipe.text,
+                    ingredient_names.get(recipe.id, ()),
+                ).items()
+            ),
+            batch_size=1000,
+        )
+
+
+class RecipeSearchTerm(models.Model):
+    """Терм поискового индекса рецептов и его вес в рецепте."""
+
+    term = models.CharField(max_length=64, verbose_name='Терм')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+    weight = models.PositiveIntegerField(verbose_name='Вес')
+
+    objects = RecipeSearchTermManager()
+
+    class Meta:
+        verbose_name = 'Поисковый терм'
+        verbose_name_plural = 'Поисковые термы'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'recipe'),
+                name='unique_recipe_search_term'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('term',),
+                name='recipe_search_term_prefix',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.term} ({self.recipe})'
+
+
+class ImageUpload(models.Model):
+    """Картинка, загруженная заранее; рецепт ссылается на неё токеном."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+    )
+    image = models.ImageField(upload_to='recipes/', verbose_name='Картинка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата загрузки',
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Загруженная картинка'
+        verbose_name_plural = 'Загруженные картинки'
+
+    def __str__(self):
+        return f'{self.image.name} ({self.user})'
+
+
+class SimilarRecipeManager(models.Manager):
+    """Пересчёт top-k похожих рецептов."""
+
+    batch_size = 500
+
+    def load_model(self, max_posting):
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.values_list(
+            'recipe_id', 'ingredients_id'
+        ).order_by().iterator():
+            ingredients[recipe_id].add(ingredient_id)
+        fans = defaultdict(set)
+        for recipe_id, user_id in Favorite.objects.values_list(
+            'recipe_id', 'user_id'
+        ).order_by().iterator():
+            fans[recipe_id].add(user_id)
+        return SimilarityModel(ingredients, fans, max_posting)
+
+    def rebuild(self, k, max_posting, full=False):
+        """Пересчитывает устаревшие рецепты и затронутых ими соседей.
+
+        Сосед пересчитывается, если устаревший рецепт был в его top-k
+        или теперь проходит в него. Возвращает число пересчитанных.
+        """
+        stale = Recipe.objects.all()
+        if not full:
+            stale = stale.filter(similar_stale=True)
+        stale_ids = set(stale.values_list('id', flat=True))
+        if not stale_ids:
+            return 0
+        model = self.load_model(max_posting)
+        current = defaultdict(dict)
+        listed_in = defaultdict(set)
+        for recipe_id, similar_id, score in self.values_list(
+            'recipe_id', 'similar_id', 'score'
+        ).iterator():
+            current[recipe_id][similar_id] = score
+            listed_in[similar_id].add(recipe_id)
+
+        computed = {}
+        affected = set()
+        for recipe_id in stale_ids:
+            scores = model.scores(recipe_id)
+            computed[recipe_id] = model.top(scores, k)
+            for neighbour, score in scores.items():
+                listed = current[neighbour]
+                if (recipe_id in listed or len(listed) < k
+                        or score > min(listed.values())):
+                    affected.add(neighbour)
+            affected |= listed_in[recipe_id]
+        for recipe_id in affected - stale_ids:
+            computed[recipe_id] = model.top(model.scores(recipe_id), k)
+
+        recipe_ids = list(computed)
+        for start in range(0, len(recipe_ids), self.batch_size):
+            batch = recipe_ids[start:start + self.batch_size]
+            with transaction.atomic():
+                # Рецепты, удалённые во время расчёта, пропускаются.
+                existing = set(Recipe.objects.filter(id__in=set(batch) | {
+                    similar_id
+                    for recipe_id in batch
+                    for similar_id, _ in computed[recipe_id]
+                }).values_list('id', flat=True))
+                self.filter(recipe_id__in=batch).delete()
+                self.bulk_create(
+                    self.model(recipe_id=recipe_id, similar_id=similar_id,
+                               score=score)
+                    for recipe_id in batch if recipe_id in existing
+                    for similar_id, score in computed[recipe_id]
+                    if similar_id in existing
+                )
+                Recipe.objects.filter(
+                    id__in=stale_ids.intersection(batch)
+                ).update(similar_stale=False)
+        return len(recipe_ids)
+
+    def recommended(self, queryset, user):
+        """Рецепты queryset по сумме сходства с избранным юзера.
+
+        Сумма считается коррелированным подзапросом: соединения фильтров
+        queryset (например, по нескольким тегам) не умножают её.
+        """
+        favorites = Favorite.objects.filter(user=user).values('recipe')
+        scores = self.filter(recipe__in=favorites)
+        return queryset.filter(
+            id__in=scores.values('similar')
+        ).exclude(id__in=favorites).exclude(author=user).annotate(
+            recommendation=Subquery(
+                scores.filter(similar=OuterRef('pk')).order_by().values(
+                    'similar'
+                ).annotate(total=Sum('score')).values('total')
+            )
+        ).order_by('-recommendation', '-id')
+
+
+class SimilarRecipe(models.Model):
+    """Один из top-k похожих рецептов, посчитанных командой."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    objects = SimilarRecipeManager()
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe} ({self.score:.2f})'
+
+
+class TrendingWatermark(models.Model):
+    """Момент, до которого события уже учтены в рейтинге.
+
+    Одна строка; update_trending читает её и сдвигает после запуска.
+    """
+    until = models.DateTimeField(verbose_name='События учтены до')
+
+    class Meta:
+        verbose_name = 'Отметка пересчёта рейтинга'
+        verbose_name_plural = 'Отметки пересчёта рейтинга'
+
+    def __str__(self):
+        return f'Рейтинг учтён до {self.until}'
@@ -0,0 +1,72 @@
+"""Похожие рецепты по составу и по общим поклонникам.
+
+Сходство двух рецептов — взвешенная сумма коэффициента Жаккара по
+ингредиентам и косинусной меры по юзерам, добавившим рецепты в
+избранное. Кандидаты берутся из инвертированных списков, поэтому
+сравниваются только рецепты с общим ингредиентом или поклонником.
+Слишком длинные списки (соль, вода) для поиска кандидатов пропускаются,
+но в самом сходстве учитываются.
+"""
+import math
+from collections import defaultdict
+from heapq import nlargest
+
+INGREDIENT_WEIGHT = 0.7
+FAVORITE_WEIGHT = 0.3
+
+
+class SimilarityModel:
+    """Множества ингредиентов и поклонников рецептов в памяти."""
+
+    def __init__(self, ingredients, fans, max_posting):
+        self.ingredients = ingredients
+        self.fans = fans
+        self.max_posting = max_posting
+        self.by_ingredient = self.invert(ingredients)
+        self.by_fan = self.invert(fans)
+
+    @staticmethod
+    def invert(sets):
+        postings = defaultdict(list)
+        for recipe_id, keys in sets.items():
+            for key in keys:
+                postings[key].append(recipe_id)
+        return postings
+
+    def candidates(self, recipe_id):
+        found = set()
+        for keys, postings in ((self.ingredients, self.by_ingredient),
+                               (self.fans, self.by_fan)):
+            for key in keys.get(recipe_id, ()):
+                posting = postings[key]
+                if len(posting) <= self.max_posting:
+                    found.update(posting)
+        found.discard(recipe_id)
+        return found
+
+    def score(self, first, second):
+        first_ingredients = self.ingredients.get(first, set())
+        second_ingredients = self.ingredients.get(second, set())
+        shared = len(first_ingredients & second_ingredients)
+        union = len(first_ingredients) + len(second_ingredients) - shared
+        score = INGREDIENT_WEIGHT * shared / union if union else 0
+        first_fans = self.fans.get(first, set())
+        second_fans = self.fans.get(second, set())
+        if first_fans and second_fans:
+            score += FAVORITE_WEIGHT * len(first_fans & second_fans) / (
+                math.sqrt(len(first_fans) * len(second_fans))
+            )
+        return score
+
+    def scores(self, recipe_id):
+        """Сходство рецепта со всеми кандидатами: {recipe_id: score}."""
+        scores = {
+            candidate: self.score(recipe_id, candidate)
+            for candidate in self.candidates(recipe_id)
+        }
+        return {key: value for key, value in scores.items() if value > 0}
+
+    @staticmethod
+    def top(scores, k):
+        return nlargest(k, scores.items(), key=lambda item: (item[1],
+                                                             -item[0]))
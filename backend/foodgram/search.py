@@ -0,0 +1,35 @@
+"""Разбиение текста рецепта на термы для поискового индекса."""
+import re
+from collections import Counter
+
+TERM_MAX_LENGTH = 64
+TERM_MIN_LENGTH = 2
+
+NAME_WEIGHT = 8
+INGREDIENT_WEIGHT = 4
+TEXT_WEIGHT = 1
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е').strip()
+
+
+def tokenize(value):
+    return [
+        token[:TERM_MAX_LENGTH]
+        for token in re.findall(r'\w+', normalize(value))
+        if len(token) >= TERM_MIN_LENGTH
+    ]
+
+
+def recipe_terms(name, text, ingredient_names):
+    """Вес каждого терма: название важнее ингредиентов, те важнее текста."""
+    weights = Counter()
+    for token in tokenize(name):
+        weights[token] += NAME_WEIGHT
+    for ingredient in ingredient_names:
+        for token in tokenize(ingredient):
+            weights[token] += INGREDIENT_WEIGHT
+    for token in tokenize(text):
+        weights[token] += TEXT_WEIGHT
+    return weights
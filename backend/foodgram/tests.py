@@ -0,0 +1,215 @@
+import json
+import os
+import runpy
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from PIL import Image
+
+from api.tests.base import FoodgramTestCase
+from backend import settings as settings_module
+from foodgram.images import generate_renditions, needs_renditions
+from foodgram.models import Favorite, Ingredient, Recipe, TrendingWatermark
+from users.models import FeedItem
+
+
+class LoadDataTest(TransactionTestCase):
+    """Импорт справочника пачками, каждая в своей транзакции."""
+
+    def write_jsonl(self, rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'ingredients.jsonl'
+        path.write_text('\n'.join(json.dumps(row) for row in rows))
+        return str(path)
+
+    def load(self, path, **options):
+        call_command('load_data', path, batch_size=2, stdout=StringIO(),
+                     **options)
+
+    def test_failed_batch_keeps_committed_batches(self):
+        path = self.write_jsonl([
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'сахар', 'measurement_unit': 'г'},
+            {'name': 'соль'},
+        ])
+        with self.assertRaises(CommandError):
+            self.load(path)
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('name', flat=True)),
+            ['мука', 'сахар'],
+        )
+
+    def test_dry_run_rolls_back_every_batch(self):
+        path = self.write_jsonl([
+            {'name': f'ингредиент {index}', 'measurement_unit': 'г'}
+            for index in range(5)
+        ])
+        self.load(path, dry_run=True)
+        self.assertFalse(Ingredient.objects.exists())
+
+
+class UpdateTrendingTest(FoodgramTestCase):
+    """Инкрементальный пересчёт рейтинга совпадает с полным."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.create_recipe(cls.users[0])
+
+    def favorite(self, user, hours_ago):
+        Favorite.objects.create(user=user, recipe=self.recipe)
+        Favorite.objects.filter(user=user).update(
+            add_date=timezone.now() - timedelta(hours=hours_ago)
+        )
+
+    def score(self, *options):
+        call_command('update_trending', *options, stdout=StringIO())
+        self.recipe.refresh_from_db()
+        return self.recipe.trending_score
+
+    def test_incremental_run_matches_full(self):
+        self.favorite(self.users[1], hours_ago=3)
+        self.score()
+        self.assertTrue(TrendingWatermark.objects.exists())
+        TrendingWatermark.objects.update(
+            until=timezone.now() - timedelta(hours=2)
+        )
+        self.favorite(self.users[2], hours_ago=1)
+        self.assertAlmostEqual(self.score(), self.score('--full'))
+
+    def test_unfavorite_lowers_score(self):
+        self.favorite(self.users[1], hours_ago=2)
+        single = self.score()
+        self.favorite(self.users[2], hours_ago=1)
+        TrendingWatermark.objects.update(
+            until=timezone.now() - timedelta(hours=1, minutes=30)
+        )
+        self.assertGreater(self.score(), single)
+        Favorite.objects.filter(user=self.users[2]).delete()
+        self.assertAlmostEqual(self.score(), single)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.trending_stale)
+
+
+class GenerateFixturesTest(TransactionTestCase):
+    """Сгенерированные даты пишутся в INSERT и сохраняются."""
+
+    def test_generated_dates_are_kept(self):
+        call_command(
+            'generate_fixtures', users=10, recipes=30, follows=10,
+            favorites=30, carts=10, stdout=StringIO(),
+        )
+        week_ago = timezone.now() - timedelta(days=7)
+        self.assertTrue(Recipe.objects.filter(pub_date__lt=week_ago).exists())
+        self.assertTrue(
+            Favorite.objects.filter(add_date__lt=week_ago).exists()
+        )
+        self.assertTrue(FeedItem.objects.exists())
+
+
+class RenditionsTest(FoodgramTestCase):
+    """Копии картинки строятся по размерам и форматам, старые удаляются."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=directory.name))
+        # Соединение теста живёт в транзакции, закрывать его нельзя.
+        self.enterContext(
+            mock.patch('foodgram.images.close_old_connections')
+        )
+
+    def save_image(self, name, size):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (255, 0, 0, 128)).save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_renditions(self):
+        recipe = self.create_recipe(
+            self.users[0], image=self.save_image('recipes/a.png', (2000, 1000))
+        )
+        self.assertTrue(needs_renditions(recipe))
+        generate_renditions(recipe.id)
+        recipe.refresh_from_db()
+        self.assertFalse(needs_renditions(recipe))
+        sizes = recipe.image_renditions['sizes']
+        self.assertEqual(
+            {size: (rendition['width'], rendition['height'])
+             for size, rendition in sizes.items()},
+            {'small': (320, 160), 'medium': (640, 320),
+             'large': (1280, 640)},
+        )
+        with default_storage.open(sizes['small']['jpeg']) as file:
+            self.assertEqual(Image.open(file).mode, 'RGB')
+        with default_storage.open(sizes['small']['webp']) as file:
+            self.assertEqual(Image.open(file).format, 'WEBP')
+
+        images = self.client_for().get(
+            f'/api/recipes/{recipe.id}/'
+        ).json()['images']
+        self.assertEqual(images['large']['width'], 1280)
+        self.assertTrue(images['large']['webp'].endswith(
+            sizes['large']['webp']
+        ))
+
+        recipe.image = self.save_image('recipes/b.png', (100, 300))
+        recipe.save()
+        generate_renditions(recipe.id)
+        self.assertFalse(default_storage.exists(sizes['small']['webp']))
+        recipe.refresh_from_db()
+        self.assertEqual(
+            recipe.image_renditions['sizes']['large']['height'], 300
+        )
+
+
+class DatabaseSettingsTest(TestCase):
+    """Настройки БД из окружения и PRAGMA новых соединений SQLite."""
+
+    DB_VARIABLES = ('DB_ENGINE', 'DB_CONN_MAX_AGE', 'DB_PGBOUNCER')
+
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            for name in set(self.DB_VARIABLES) - environ.keys():
+                os.environ.pop(name, None)
+            return runpy.run_path(settings_module.__file__)
+
+    def test_sqlite_by_default(self):
+        database = self.load_settings()['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+
+    def test_postgresql(self):
+        database = self.load_settings(
+            DB_ENGINE='postgresql', DB_CONN_MAX_AGE='0', DB_PGBOUNCER='True'
+        )['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        database = self.load_settings(
+            DB_ENGINE='postgresql'
+        )['DATABASES']['default']
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('PRAGMA есть только у SQLite.')
+        new_connection = connections.create_connection('default')
+        self.addCleanup(new_connection.close)
+        with self.settings(SQLITE_PRAGMAS={'busy_timeout': 1234,
+                                           'synchronous': 'OFF'}):
+            with new_connection.cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 1234)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 0)
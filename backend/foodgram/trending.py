@@ -0,0 +1,37 @@
+"""Рейтинг «набирающих популярность» рецептов.
+
+Каждое добавление в избранное или корзину весит w·exp(-λ·(now - t)),
+λ = ln2 / период полураспада. Общий множитель exp(-λ·now) одинаков
+для всех рецептов и на порядок не влияет, поэтому в колонке хранится
+log Σ w·exp(λ·t): она не устаревает со временем, а новые события
+добавляются к ней через logaddexp без пересчёта старых.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+# Время отсчитывается от фиксированной даты, чтобы числа были меньше.
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+WEIGHTS = {
+    'favorite': 1.0,
+    'cart': 0.5,
+}
+
+
+def decay_rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE * 60 * 60)
+
+
+def event_score(moment, weight):
+    """Логарифм вклада одного события."""
+    return (
+        decay_rate() * (moment - EPOCH).total_seconds() + math.log(weight)
+    )
+
+
+def logaddexp(first, second):
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
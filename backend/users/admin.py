@@ -11,7 +11,9 @@ class UserAdmin(admin.ModelAdmin):
         'username',
         'first_name',
         'last_name',
-        'password'
+        'password',
+        'recipes_count',
+        'followers_count',
     )
     search_fields = ('username', 'email')
     list_filter = ('username', 'email')
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feed(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    FeedItem = apps.get_model('users', 'FeedItem')
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(
+                user_id=user_id,
+                author_id=author_id,
+                recipe_id=recipe_id,
+                pub_date=pub_date,
+            )
+            for user_id, author_id in Follow.objects.values_list(
+                'user_id', 'author_id'
+            )
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).values_list('id', 'pub_date')
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0005_recipe_pub_date_id_index'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodgram.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Лента подписок',
+                'indexes': [models.Index(fields=['user', 'author', '-pub_date', '-id'], name='feed_user_author_pub_date')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_recipe'),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+# Снимок на момент миграции: count_rows из foodgram.models может
+# измениться вместе с моделями.
+FILL_COUNTERS = """
+UPDATE users_customuser SET
+    recipes_count = (
+        SELECT COUNT(*) FROM foodgram_recipe
+        WHERE foodgram_recipe.author_id = users_customuser.id
+    ),
+    followers_count = (
+        SELECT COUNT(*) FROM users_follow
+        WHERE users_follow.author_id = users_customuser.id
+    )
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0008_counters'),
+        ('users', '0002_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='recipes_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число рецептов'),
+        ),
+        migrations.RunSQL(FILL_COUNTERS, migrations.RunSQL.noop),
+    ]
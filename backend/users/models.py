@@ -1,11 +1,15 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 
 
 class CustomUser(AbstractUser):
     """Кастомный юзер под Фудграм."""
 
+    DENORMALIZED_FIELDS = ('recipes_count', 'followers_count')
+
     email = models.EmailField(
         max_length=254,
         unique=True,
@@ -37,6 +41,16 @@ class CustomUser(AbstractUser):
         max_length=150,
         verbose_name='Пароль'
     )
+    recipes_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов',
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков',
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -48,6 +62,16 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        """Денормализованные поля меняются только через update()."""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     """Подписка на автора рецепта."""
@@ -81,3 +105,142 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user.username} подписан на {self.author.username}'
+
+
+class FeedManager(models.Manager):
+    """Раскладка рецептов по лентам подписчиков (fan-out on write)."""
+
+    batch_size = 1000
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты всех подписчиков автора."""
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    author_id=recipe.author_id,
+                    recipe=recipe,
+                    pub_date=recipe.pub_date,
+                )
+                for user_id in Follow.objects.filter(
+                    author_id=recipe.author_id
+                ).values_list('user_id', flat=True).iterator()
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def follow(self, user_id, author_id):
+        """Заполняет ленту нового подписчика рецептами автора."""
+        Recipe = self.model._meta.get_field('recipe').related_model
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in Recipe.objects.filter(
+                    author_id=author_id
+                ).values_list('id', 'pub_date').iterator()
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def rebuild(self):
+        """Пересобирает ленты одним INSERT ... SELECT по подпискам.
+
+        Строки не проходят через Python, поэтому пересборка миллионов
+        записей упирается только в СУБД.
+        """
+        Recipe = self.model._meta.get_field('recipe').related_model
+        select, params = Recipe.objects.filter(
+            author__following__isnull=False
+        ).values_list(
+            'author__following__user_id', 'author_id', 'id', 'pub_date',
+        ).order_by().query.sql_with_params()
+        quote = connections[self.db].ops.quote_name
+        columns = ', '.join(
+            quote(self.model._meta.get_field(name).column)
+            for name in ('user', 'author', 'recipe', 'pub_date')
+        )
+        # Иначе между DELETE и INSERT ленты видны пустыми, а ошибка
+        # вставки оставляет их пустыми совсем.
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {quote(self.model._meta.db_table)} '
+                    f'({columns}) {select}',
+                    params,
+                )
+
+    def latest(self, user, author_ids, limit=None):
+        """Последние рецепты авторов одним запросом: {author_id: [...]}.
+
+        Срез recipes_limit делается в SQL оконной функцией по индексу
+        (user, author, -pub_date).
+        """
+        items = self.filter(
+            user=user, author_id__in=author_ids
+        ).select_related('recipe').order_by('author', '-pub_date', '-id')
+        if limit is not None:
+            items = items.annotate(position=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )).filter(position__lte=limit)
+        recipes = {author_id: [] for author_id in author_ids}
+        for item in items:
+            recipes[item.author_id].append(item.recipe)
+        return recipes
+
+
+class FeedItem(models.Model):
+    """Рецепт автора в ленте подписчика."""
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    recipe = models.ForeignKey(
+        'foodgram.Recipe',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedManager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author', '-pub_date', '-id'),
+                name='feed_user_author_pub_date',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -3,10 +3,21 @@ from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from api.fields import ImageRenditionsField
+from api.profiling import SerializerTimingMixin
+from api.sparse import SparseFieldsMixin
 from foodgram.models import Recipe
 from users.models import Follow, CustomUser
 
 
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса или None."""
+    try:
+        return max(int(request.query_params['recipes_limit']), 0)
+    except (KeyError, ValueError):
+        return None
+
+
 class UnsubscribeSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -18,14 +29,16 @@ class MiniRecipeSerializer(serializers.ModelSerializer):
     """Вложенный сериализатор минирецепта."""
 
     image = Base64ImageField()
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SerializerTimingMixin, SparseFieldsMixin,
+                        serializers.ModelSerializer):
     """Сериализатор для получения списка, профиля и текущего юзера."""
     is_subscribed = serializers.SerializerMethodField()
 
@@ -38,17 +51,23 @@ class ProfileSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
+            'recipes_count',
+            'followers_count',
         )
-        read_only_fields = ('is_subscribed',)
+        read_only_fields = ('is_subscribed', 'recipes_count',
+                            'followers_count')
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         current_user = self.context.get('request').user
         if current_user.is_anonymous:
             return False
         return Follow.objects.filter(user=current_user, author=obj.id).exists()
 
 
-class CustomUserCreateSerializer(UserCreateSerializer):
+class CustomUserCreateSerializer(SerializerTimingMixin, UserCreateSerializer):
     """Сериализато создания юзера."""
     class Meta:
         model = CustomUser
@@ -62,7 +81,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
     username = serializers.ReadOnlyField(source='author.username')
@@ -70,7 +89,7 @@ class FollowSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
 
     class Meta:
         model = Follow
@@ -95,22 +114,26 @@ class FollowSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         current_user = self.context.get('request').user
         if current_user.is_anonymous:
             return False
-        return Follow.objects.filter(user=current_user, author=obj.id).exists()
+        return Follow.objects.filter(
+            user=current_user, author=obj.author_id
+        ).exists()
 
     def get_recipes(self, obj):
-        request = self.context('request')
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            recipes_limit = int(recipes_limit)
-            recipes = recipes[:recipes_limit]
+        """Рецепты автора из ленты, выбранной вью одним запросом."""
+        feed = self.context.get('feed')
+        if feed is not None:
+            recipes = feed.get(obj.author_id, [])
+        else:
+            recipes = obj.author.recipes.all()
+            recipes_limit = get_recipes_limit(self.context['request'])
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = MiniRecipeSerializer(
-            recipes, many=True, read_only=True)
+            recipes, many=True, read_only=True, context=self.context)
         return serializer.data
-
-    def get_recipes_count(self, obj):
-        recipes = obj.recipes.all()
-        return recipes.count()
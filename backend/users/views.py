@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -8,20 +10,36 @@ from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 from api.pagination import CustomPagination
-from users.models import Follow, CustomUser
-from users.serializers import FollowSerializer, UnsubscribeSerializer
+from api.sparse import SparseFieldsViewMixin
+from users.models import CustomUser, FeedItem, Follow
+from users.serializers import (FollowSerializer, UnsubscribeSerializer,
+                               get_recipes_limit)
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(SparseFieldsViewMixin, UserViewSet):
 
     permission_classes = (IsAuthenticated,)
     pagination_class = CustomPagination
+    sparse_actions = ('list', 'retrieve', 'me')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated or not self.wants('is_subscribed'):
+            return queryset
+        return queryset.annotate(
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        )
 
     @action(methods=['post'], detail=True)
     def subscribe(self, request, id=None):
         user = request.user
         author = get_object_or_404(CustomUser, id=id)
-        follow = Follow.objects.create(user=user, author=author)
+        with transaction.atomic():
+            # Лента подписчика заполняется сигналом в той же транзакции.
+            follow = Follow.objects.create(user=user, author=author)
         serializer = FollowSerializer(
             follow, context={'request': request}
         )
@@ -43,7 +61,28 @@ class FollowListViewSet(ListModelMixin, GenericViewSet):
     """Вью для списка авторов, на которых подписан текущий пользователь."""
     serializer_class = FollowSerializer
     pagination_class = CustomPagination
+    permission_classes = (IsAuthenticated,)
+    keyset_ordering = ('-id',)
 
     def get_queryset(self):
         user = self.request.user
-        return Follow.objects.filter(follower__user=user)
+        return Follow.objects.filter(user=user).select_related(
+            'author'
+        ).annotate(is_subscribed=Value(True)).order_by('-id')
+
+    def list(self, request, *args, **kwargs):
+        """Страница подписок: рецепты всех авторов читаются из ленты."""
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        feed = FeedItem.objects.latest(
+            request.user,
+            [follow.author_id for follow in page],
+            get_recipes_limit(request),
+        )
+        serializer = self.get_serializer(
+            page,
+            many=True,
+            context={**self.get_serializer_context(), 'feed': feed},
+        )
+        return self.get_paginated_response(serializer.data)